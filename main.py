@@ -6,9 +6,17 @@ This software is provided under the MIT License.
 See the accompanying LICENSE file for terms.
 """
 
+import time
+
+# Taken before anything else is imported, for --profile-startup
+STARTED = time.perf_counter()
+STARTED_CPU = time.process_time()
+
+import argparse
 import tkinter as tk
 import os
 import sys
+import threading
 from pathlib import Path
 
 # Add the project root to path
@@ -16,30 +24,66 @@ project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
 # Import application modules
-from src.utils import Config, Logger, get_available_cameras, LocalStorage
+from src.utils import Config, Logger, LocalStorage, ResourceGovernor, StartupProfiler
 from src.gui import MainWindow
 
-def main():
+IMPORTED = time.perf_counter()
+IMPORTED_CPU = time.process_time()
+
+def write_startup_profile(root, app, path):
+    """Write the startup profile once the window has finished loading in the background"""
+    if app.pending_startup:
+        root.after(100, write_startup_profile, root, app, path)
+        return
+    
+    # Timing the imports starts a second interpreter, so keep it off the Tk thread
+    threading.Thread(
+        target=StartupProfiler().write, args=(path, "src.gui.main_window"),
+        name="startup-profile", daemon=True
+    ).start()
+
+def main(argv=None):
     """Main application entry point"""
+    parser = argparse.ArgumentParser(description="Face Recognition Attendance System")
+    parser.add_argument("--profile-startup", nargs="?", const="", default=None, metavar="REPORT",
+                        help="Time each startup phase and write a JSON report "
+                             "(default: startup_profile.json in the logs directory)")
+    args = parser.parse_args(argv)
+    
+    profiler = StartupProfiler()
+    if args.profile_startup is not None:
+        profiler.enable(STARTED)
+        profiler.record("imports", STARTED, IMPORTED - STARTED, IMPORTED_CPU - STARTED_CPU)
+    
+    # Load the configuration and create the data directories
+    with profiler.phase("config"):
+        config = Config()
+    
     # Initialize logger
-    logger = Logger.setup()
+    with profiler.phase("logger"):
+        logger = Logger.setup()
     logger.info("Starting Face Recognition Attendance System")
     
+    # Apply CPU thread and affinity limits before any heavy work starts
+    with profiler.phase("resource_governor"):
+        ResourceGovernor().apply()
+    
     # Initialize local storage
-    local_storage = LocalStorage()
+    with profiler.phase("local_storage"):
+        local_storage = LocalStorage()
     logger.info("Local storage initialized for attendance tracking")
     
-    # Pre-detect cameras to speed up initialization
-    # This helps detect cameras before the GUI is shown
-    config = Config()
-    if config.get("camera", "detect_cameras", default=True):
-        logger.info("Pre-detecting available cameras...")
-        available_cameras = get_available_cameras()
-        logger.info(f"Detected {len(available_cameras)} camera(s) during initialization")
-    
-    # Create main window
-    root = tk.Tk()
-    app = MainWindow(root)
+    # Create main window; it loads the recognizer and probes cameras in the
+    # background, so it shows up right away
+    with profiler.phase("tk_init"):
+        root = tk.Tk()
+    with profiler.phase("main_window"):
+        app = MainWindow(root)
+    
+    if args.profile_startup is not None:
+        report_path = args.profile_startup or Path(config.get("paths", "logs")) / "startup_profile.json"
+        root.after_idle(profiler.mark, "window_shown")
+        root.after(100, write_startup_profile, root, app, report_path)
     
     # Run the application
     root.mainloop()
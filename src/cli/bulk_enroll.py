@@ -0,0 +1,224 @@
+"""
+Bulk enrollment of a whole cohort from a CSV roster and a photo directory.
+
+Usage:
+    python -m src.cli.bulk_enroll roster.csv photos/ [--workers N]
+
+The roster needs ``student_id`` and ``name`` columns and may have an
+``image`` column with a photo path relative to the photo directory.
+Without it, photos are looked up as ``photos/<student_id>.jpg`` and
+``photos/<student_id>/*.jpg`` (also .jpeg and .png).
+
+Photos are encoded on a process pool and go into the content-addressed
+image store, so a photo listed twice is stored and enrolled once. Every
+result is appended to a progress file, so an interrupted run picks up where
+it stopped when started again with the same arguments.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from ..utils.logger import Logger
+from ..database.db_manager import DatabaseManager
+from ..face_recognition.recognizer import FaceRecognizer
+from ..face_recognition.gallery_store import GalleryStore
+from ..face_recognition.image_store import ImageStore
+from ..face_recognition.chips import ChipCache, encode_with_chip
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def encode_image(path, store_settings, chip_dir, landmark_model, num_jitters):
+    """Encode the first face in a photo and store it; runs in a worker process
+
+    The photo, its working copy and its chip are written by the worker, so
+    the parent process only collects encodings.
+
+    Returns:
+        tuple: (path, image digest, encoding as a list or None, error message or None)
+    """
+    try:
+        data = Path(path).read_bytes()
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return path, None, None, "not an image"
+
+        store = ImageStore(*store_settings, asynchronous=False)
+        working = store.working_copy(image)
+        encoding, chip = encode_with_chip(cv2.cvtColor(working, cv2.COLOR_BGR2RGB), landmark_model, num_jitters)
+        if encoding is None:
+            return path, None, None, "no face found"
+        digest = store.put(data, image, working)
+        ChipCache(chip_dir).save(digest, chip)
+    except Exception as e:
+        return path, None, None, str(e)
+    return path, digest, encoding.tolist(), None
+
+
+def read_roster(roster_file, image_dir):
+    """Read the roster and find the photos for each student
+
+    Returns:
+        list: (name, student_id, [photo paths]) for each roster row
+    """
+    students = []
+    with open(roster_file, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        missing = {"student_id", "name"} - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f"Roster is missing column(s): {', '.join(sorted(missing))}")
+
+        for row in reader:
+            student_id = row["student_id"].strip()
+            name = row["name"].strip()
+            if not student_id or not name:
+                continue
+
+            if row.get("image"):
+                images = [image_dir / row["image"].strip()]
+            else:
+                images = [image_dir / f"{student_id}{ext}" for ext in IMAGE_EXTENSIONS]
+                student_dir = image_dir / student_id
+                if student_dir.is_dir():
+                    images += sorted(p for p in student_dir.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+            students.append((name, student_id, [str(p) for p in images if p.is_file()]))
+    return students
+
+
+def load_progress(progress_file):
+    """Load the photos an earlier, interrupted run encoded successfully
+
+    Photos that failed (no face, unreadable) are tried again.
+    """
+    done = {}
+    if progress_file.exists():
+        with open(progress_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    continue
+                if result.get("error") is None and result.get("encoding") is not None:
+                    done[result["path"]] = result
+    return done
+
+
+def encode_all(paths, done, progress_file, workers, recognizer, logger):
+    """Encode photos on a process pool, recording each result as it arrives"""
+    pending = [path for path in paths if path not in done]
+    if len(pending) < len(paths):
+        logger.info(f"Resuming: {len(paths) - len(pending)} photo(s) already encoded")
+
+    total = len(pending)
+    started = time.monotonic()
+    with open(progress_file, 'a', encoding='utf-8') as progress, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        store = recognizer.image_store
+        store_settings = (str(store.directory), store.working_size, store.jpeg_quality)
+        futures = [
+            pool.submit(encode_image, path, store_settings, str(recognizer.chips.directory),
+                        recognizer.landmark_model, recognizer.num_jitters)
+            for path in pending
+        ]
+        for count, future in enumerate(as_completed(futures), start=1):
+            path, digest, encoding, error = future.result()
+            result = {"path": path, "digest": digest, "encoding": encoding, "error": error}
+            done[path] = result
+            progress.write(json.dumps(result) + "\n")
+            progress.flush()
+
+            if error:
+                logger.warning(f"Skipping {path}: {error}")
+            if count % 50 == 0 or count == total:
+                rate = count / max(time.monotonic() - started, 1e-6)
+                logger.info(f"Encoded {count}/{total} photo(s) ({100 * count // total}%, {rate:.1f}/s)")
+    return done
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Enroll a cohort of students from a CSV roster and photos")
+    parser.add_argument("roster", type=Path, help="CSV file with student_id and name columns")
+    parser.add_argument("image_dir", type=Path, help="Directory holding the students' photos")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Number of encoding processes (default: all cores)")
+    parser.add_argument("--progress", type=Path, default=None,
+                        help="Progress file used to resume (default: <roster>.progress.jsonl)")
+    args = parser.parse_args(argv)
+
+    logger = Logger.setup()
+    progress_file = args.progress or args.roster.with_name(args.roster.name + ".progress.jsonl")
+
+    try:
+        students = read_roster(args.roster, args.image_dir)
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not read roster: {e}")
+        return 1
+    logger.info(f"Roster lists {len(students)} student(s)")
+
+    recognizer = FaceRecognizer()
+    db = recognizer.db or DatabaseManager()
+    digests = {image: GalleryStore.file_digest(image) for _, _, images in students for image in images}
+    if recognizer.backend == "sqlite":
+        # Includes encodings registered by a run interrupted before it finished
+        enrolled = db.images_in_use(set(digests.values()))
+    else:
+        enrolled = {entry["sha1"] for entry in recognizer.store.read_manifest().values() if entry["row"] is not None}
+
+    # Photos already enrolled by an earlier run, or listed twice, are skipped
+    photos = []
+    seen = set()
+    for name, student_id, images in students:
+        if not images:
+            logger.warning(f"No photo found for {name} ({student_id})")
+        for image in images:
+            digest = digests[image]
+            if digest not in enrolled and digest not in seen:
+                seen.add(digest)
+                photos.append((name, student_id, image))
+
+    done = encode_all([image for _, _, image in photos], load_progress(progress_file),
+                      progress_file, args.workers, recognizer, logger)
+
+    # The workers have already written the photos into the image store
+    encodings, names, ids, sources = [], [], [], []
+    for name, student_id, image in photos:
+        result = done[image]
+        if result["encoding"] is None:
+            continue
+        encodings.append(result["encoding"])
+        names.append(name)
+        ids.append(student_id)
+        sources.append(recognizer.store_source(result["digest"], student_id))
+
+    # Students and their encodings go into the database in one transaction,
+    # then every encoding is added to the gallery in a single write. Students
+    # without a face are not registered, so they can still be enrolled later.
+    with_faces = set(ids)
+    db.register_students([(name, student_id) for name, student_id, _ in students if student_id in with_faces],
+                         zip(ids, encodings, [source["sha1"] for source in sources]))
+    if encodings:
+        recognizer.add_encodings(encodings, names, ids, sources)
+    progress_file.unlink(missing_ok=True)
+
+    failed = sum(1 for _, _, image in photos if done[image]["encoding"] is None)
+    in_gallery = set(recognizer.gallery.ids)
+    not_enrolled = [student_id for _, student_id, _ in students if student_id not in in_gallery]
+    logger.info(f"Bulk enrollment complete: {len(encodings)} face(s) added, {failed} photo(s) skipped, "
+                f"{len(not_enrolled)} student(s) not enrolled, {len(recognizer.gallery)} face encodings in gallery")
+    if not_enrolled:
+        logger.warning(f"Not enrolled (no photo or no face found): {', '.join(not_enrolled)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
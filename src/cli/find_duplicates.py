@@ -0,0 +1,65 @@
+"""
+Find students who are enrolled more than once under different IDs.
+
+Usage:
+    python -m src.cli.find_duplicates [--tolerance T] [--block-size N] [--output pairs.csv]
+
+Every face in the gallery is compared with every other one in blocks of
+matrix products, so memory stays bounded by the block size. Each pair of
+different student IDs whose closest faces are within the tolerance is
+reported, closest first.
+"""
+
+import argparse
+import csv
+import sys
+import time
+from pathlib import Path
+
+from ..utils.config import Config
+from ..utils.logger import Logger
+from ..face_recognition.recognizer import FaceRecognizer
+from ..face_recognition.duplicates import find_duplicate_identities, DEFAULT_BLOCK_SIZE
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    config = Config()
+    parser = argparse.ArgumentParser(description="Report different student IDs with matching faces")
+    parser.add_argument("--tolerance", type=float, default=config.get("recognition", "tolerance"),
+                        help="Distance below which two faces match (default: recognition tolerance)")
+    parser.add_argument("--block-size", type=int,
+                        default=config.get("gallery", "duplicate_block_size", default=DEFAULT_BLOCK_SIZE),
+                        help="Rows compared per block; memory grows with its square")
+    parser.add_argument("--output", type=Path, default=None, help="Also write the pairs to a CSV file")
+    args = parser.parse_args(argv)
+
+    logger = Logger.setup()
+    gallery = FaceRecognizer().gallery
+    logger.info(f"Checking {len(gallery)} face encodings for duplicate identities "
+                f"(tolerance {args.tolerance}, block size {args.block_size})")
+
+    started = time.monotonic()
+
+    def progress(done, total):
+        logger.info(f"Compared {done}/{total} rows ({100 * done // total}%, {time.monotonic() - started:.0f}s)")
+
+    pairs = find_duplicate_identities(gallery, args.tolerance, args.block_size, progress)
+    for pair in pairs:
+        logger.warning(f"{pair.name_a} ({pair.student_a}) and {pair.name_b} ({pair.student_b}) "
+                       f"look like the same person (distance {pair.distance:.3f})")
+
+    if args.output:
+        with open(args.output, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["student_a", "name_a", "student_b", "name_b", "distance"])
+            for pair in pairs:
+                writer.writerow([pair.student_a, pair.name_a, pair.student_b, pair.name_b, f"{pair.distance:.4f}"])
+        logger.info(f"Wrote {len(pairs)} pair(s) to {args.output}")
+
+    logger.info(f"Found {len(pairs)} possible duplicate identities in {time.monotonic() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
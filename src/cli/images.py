@@ -0,0 +1,49 @@
+"""
+Maintenance of the enrollment image store.
+
+Usage:
+    python -m src.cli.images pack [--older-than DAYS]
+    python -m src.cli.images stats
+
+``pack`` moves originals that have not been touched for a while into a
+single pack file, so a large cohort does not leave hundreds of thousands of
+small files behind. Working copies stay loose, since they are what gets
+read when the gallery is re-encoded.
+"""
+
+import argparse
+import sys
+
+from ..utils.config import Config
+from ..utils.logger import Logger
+from ..face_recognition.image_store import ImageStore
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    config = Config()
+    parser = argparse.ArgumentParser(description="Maintain the enrollment image store")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    pack = commands.add_parser("pack", help="Pack cold originals into a single file")
+    pack.add_argument("--older-than", type=float,
+                      default=config.get("image_store", "pack_after_days", default=30),
+                      help="Pack originals not modified for this many days")
+    commands.add_parser("stats", help="Show how many images are stored")
+    args = parser.parse_args(argv)
+
+    logger = Logger.setup()
+    store = ImageStore(config.get("paths", "image_store_dir", default="data/image_store"), asynchronous=False)
+
+    if args.command == "pack":
+        packed = store.pack_cold(args.older_than)
+        logger.info(f"Packed {packed} original(s) older than {args.older_than:g} day(s)")
+    else:
+        stats = store.stats()
+        logger.info(f"Image store: {stats['loose']} loose original(s), {stats['packed']} packed "
+                    f"in {stats['packs']} pack(s), {stats['working']} working copies")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""
+Check how long it takes to import what the GUI needs before its window shows.
+
+Usage:
+    python -m src.cli.import_budget [--budget-ms MS] [--top N] [module ...]
+
+Each module (default: src.gui.main_window) is imported in a fresh
+interpreter under ``python -X importtime``. The slowest imports are
+reported, and the check fails if the total is over budget or if a heavy
+dependency that should only load on first use was imported.
+"""
+
+import argparse
+import sys
+
+from ..utils.logger import Logger
+from ..utils.startup_profiler import import_times
+
+# Loaded on first use: exporting a report, showing a frame, or creating the recognizer
+LAZY_MODULES = ("pandas", "face_recognition", "dlib", "PIL")
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Check the import time of the GUI startup path")
+    parser.add_argument("modules", nargs="*", default=["src.gui.main_window"],
+                        help="Modules to import (default: src.gui.main_window)")
+    parser.add_argument("--budget-ms", type=float, default=500,
+                        help="Maximum total import time per module in milliseconds")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to report")
+    args = parser.parse_args(argv)
+
+    logger = Logger.setup()
+    failed = False
+    for module in args.modules:
+        try:
+            times = import_times(module)
+        except RuntimeError as e:
+            logger.error(str(e))
+            failed = True
+            continue
+
+        total_ms = sum(self_us for _, self_us, _ in times) / 1000
+        logger.info(f"Importing {module} took {total_ms:.0f} ms ({len(times)} modules, budget {args.budget_ms:g} ms)")
+        for package, _, cumulative_us in sorted(times, key=lambda t: t[2], reverse=True)[:args.top]:
+            logger.info(f"  {cumulative_us / 1000:8.1f} ms  {package}")
+
+        eager = sorted({package.split(".")[0] for package, _, _ in times} & set(LAZY_MODULES))
+        if eager:
+            logger.error(f"{module} imports {', '.join(eager)} at load time; import them on first use instead")
+            failed = True
+        if total_ms > args.budget_ms:
+            logger.error(f"{module} is over its import budget by {total_ms - args.budget_ms:.0f} ms")
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
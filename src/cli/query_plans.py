@@ -0,0 +1,48 @@
+"""
+Check that the attendance report queries are served by indexes.
+
+Usage:
+    python -m src.cli.query_plans [--verbose]
+
+Every report query is run through ``EXPLAIN QUERY PLAN`` against the
+configured database (migrating it first, like the application does). The
+check fails if any query scans a whole table or sorts its result instead
+of reading an index in order.
+"""
+
+import argparse
+import sys
+
+from ..utils.logger import Logger
+from ..database.db_manager import DatabaseManager
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Check the query plans of the report queries")
+    parser.add_argument("--verbose", action="store_true", help="Print every query plan")
+    args = parser.parse_args(argv)
+
+    logger = Logger.setup()
+    db = DatabaseManager()
+    try:
+        plans = db.query_plans()
+        problems = db.check_query_plans()
+    finally:
+        db.close()
+
+    for name, plan in plans.items():
+        if args.verbose or name in problems:
+            logger.info(f"{name}:")
+            for step in plan:
+                logger.info(f"  {step}")
+        for step in problems.get(name, []):
+            logger.error(f"{name} does not use an index: {step}")
+
+    if not problems:
+        logger.info(f"All {len(plans)} report queries use indexes")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+"""
+Re-encode the whole gallery after changing the jitter count.
+
+Usage:
+    python -m src.cli.reencode [--workers N]
+
+Encodings are recomputed from the aligned face chips saved at enrollment,
+so no face detection is needed. The chips keep the alignment they were
+enrolled with: changing recognition.landmark_model only affects faces
+enrolled afterwards, not this job. Photos enrolled before chips existed are
+detected once. An interrupted run resumes where it stopped, and running
+stations switch to the new gallery in one step when the job is done.
+"""
+
+import argparse
+import os
+import sys
+
+from ..utils.logger import Logger
+from ..face_recognition.recognizer import FaceRecognizer
+from ..face_recognition.reencode import ReencodeJob
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Re-encode the face gallery from cached face chips")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Number of encoding processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    logger = Logger.setup()
+    recognizer = FaceRecognizer()
+    if recognizer.backend != "files":
+        logger.error("Re-encoding is only available with the files gallery backend")
+        return 1
+
+    try:
+        return 0 if ReencodeJob(recognizer, args.workers).run() else 1
+    except KeyboardInterrupt:
+        logger.info("Re-encoding interrupted; run again to resume")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
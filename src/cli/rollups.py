@@ -0,0 +1,50 @@
+"""
+Rebuild or check the attendance rollup tables.
+
+Usage:
+    python -m src.cli.rollups rebuild
+    python -m src.cli.rollups check
+
+The per-day and per-student-per-month counts are kept up to date by
+triggers and are filled in when an existing database is upgraded. Only
+registered students are counted. ``rebuild`` recomputes them from the
+attendance table, e.g. after attendance rows were edited with the
+triggers dropped; ``check`` reports whether they still match it.
+"""
+
+import argparse
+import sys
+
+from ..utils.logger import Logger
+from ..database.db_manager import DatabaseManager
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Rebuild or check the attendance rollups")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rebuild", help="Recompute the rollups from the attendance table")
+    commands.add_parser("check", help="Check that the rollups match the attendance table")
+    args = parser.parse_args(argv)
+
+    logger = Logger.setup()
+    db = DatabaseManager()
+    try:
+        if args.command == "rebuild":
+            return 0 if db.rebuild_rollups() else 1
+
+        mismatches = db.check_rollups()
+        if mismatches is None:
+            return 1
+        if mismatches:
+            logger.error(f"{mismatches} rollup row(s) do not match the attendance table; "
+                         f"run 'python -m src.cli.rollups rebuild'")
+            return 1
+        logger.info("Attendance rollups match the attendance table")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
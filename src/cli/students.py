@@ -0,0 +1,60 @@
+"""
+Remove or re-enroll individual students.
+
+Usage:
+    python -m src.cli.students remove STUDENT_ID
+    python -m src.cli.students replace STUDENT_ID photo.jpg [photo.jpg ...] [--name NAME]
+
+Both commands update the database, the face gallery and the enrollment
+photos together. Running stations pick the change up like any other
+gallery update.
+"""
+
+import argparse
+import sys
+
+import cv2
+
+from ..utils.logger import Logger
+from ..database.db_manager import DatabaseManager
+from ..face_recognition.recognizer import FaceRecognizer
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Remove or re-enroll students")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    remove = commands.add_parser("remove", help="Delete a student and their faces")
+    remove.add_argument("student_id")
+
+    replace = commands.add_parser("replace", help="Replace a student's faces with new photos")
+    replace.add_argument("student_id")
+    replace.add_argument("photos", nargs="+", help="Photos of the student's face")
+    replace.add_argument("--name", default=None, help="Also change the student's name; required to enroll an unknown ID")
+    args = parser.parse_args(argv)
+
+    logger = Logger.setup()
+    recognizer = FaceRecognizer(DatabaseManager())
+
+    try:
+        if args.command == "remove":
+            return 0 if recognizer.remove_student(args.student_id) else 1
+
+        images = []
+        for photo in args.photos:
+            image = cv2.imread(photo)
+            if image is None:
+                logger.error(f"Could not read photo {photo}")
+                return 1
+            images.append(image)
+        return 0 if recognizer.replace_student_faces(args.student_id, images, args.name) else 1
+    except ValueError as e:
+        logger.error(str(e))
+        return 1
+    finally:
+        recognizer.image_store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1 +1,2 @@
 from .db_manager import DatabaseManager
+from .attendance_writer import AttendanceWriter
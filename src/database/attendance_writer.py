@@ -0,0 +1,165 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import namedtuple
+from ..utils.resource_governor import ResourceGovernor
+
+AttendanceMark = namedtuple("AttendanceMark", ["student_id", "name", "captured_at"])
+
+
+class AttendanceWriter:
+    """Write attendance marks on a background thread, in batches
+
+    The capture loop only queues a mark. The writer collects marks until
+    ``batch_size`` are waiting or ``flush_interval`` seconds have passed
+    since the oldest one, then writes them to the database in a single
+    transaction and to local storage in a single file write.
+
+    Every mark carries the time its frame was captured, so waiting in the
+    queue does not change the recorded attendance time.
+
+    The writer also keeps the set of students already marked today, loaded
+    from the database at startup and emptied when the date changes. One
+    writer serves every camera, so a student who stays in view is only
+    written once a day, however many cameras see them. Students of a batch
+    that could not be written are taken out of the set again, so they are
+    queued the next time they are seen.
+    """
+
+    def __init__(self, db, local_storage=None, batch_size=64, flush_interval=1.0):
+        self.db = db
+        self.local_storage = local_storage
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.logger = logging.getLogger("attendance_system")
+        self.governor = ResourceGovernor()
+
+        # Students marked on self._marked_date
+        self._marked_lock = threading.Lock()
+        self._marked_date = self._date(time.time())
+        self._marked = set(db.students_marked_on(self._marked_date))
+
+        self._queue = queue.Queue()
+        self._closed = False
+        self._close_lock = threading.Lock()
+
+        self._thread = threading.Thread(target=self._run, name="attendance-writer", daemon=True)
+        self._thread.start()
+
+        # Also flush when the interpreter exits without on_close (e.g. Ctrl+C)
+        atexit.register(self.close)
+
+    @staticmethod
+    def _date(timestamp):
+        """Local date of an epoch timestamp, as stored in the attendance table"""
+        return time.strftime("%Y-%m-%d", time.localtime(timestamp))
+
+    def submit(self, student_id, name, captured_at=None):
+        """Queue an attendance mark unless the student is already marked that day
+
+        Args:
+            student_id: Student ID
+            name: Student name, for local storage
+            captured_at: Epoch seconds when the frame was captured (default: now)
+
+        Returns:
+            bool: True if the mark was queued, False if it was already made
+        """
+        if captured_at is None:
+            captured_at = time.time()
+        date = self._date(captured_at)
+
+        with self._marked_lock:
+            if date > self._marked_date:
+                # A new day: nobody is marked yet
+                self._marked_date = date
+                self._marked = set()
+            if date == self._marked_date:
+                if student_id in self._marked:
+                    return False
+                self._marked.add(student_id)
+
+        self._queue.put(AttendanceMark(student_id, name, captured_at))
+        return True
+
+    def close(self, timeout=10.0):
+        """Write every queued mark and stop the writer thread
+
+        Marks still queued if the thread does not finish in time are
+        written from the calling thread, so none are lost on shutdown.
+        """
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            self.logger.warning("Attendance writer did not stop in time; writing the remaining marks directly")
+
+        leftovers = []
+        while True:
+            try:
+                mark = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if mark is not None:
+                leftovers.append(mark)
+        if leftovers:
+            self._write(leftovers)
+
+    def _run(self):
+        """Writer loop"""
+        self.governor.pin_current_thread()
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if not batch else max(0.0, deadline - time.monotonic())
+            try:
+                mark = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                mark = False  # Flush interval elapsed
+
+            if mark is None:
+                if batch:
+                    self._write(batch)
+                return
+
+            if mark:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(mark)
+
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._write(batch)
+                batch = []
+
+    def _unmark(self, batch):
+        """Forget a failed batch's students, so their next sighting is queued again"""
+        with self._marked_lock:
+            for mark in batch:
+                if self._date(mark.captured_at) == self._marked_date:
+                    self._marked.discard(mark.student_id)
+
+    def _write(self, batch):
+        """Write a batch of marks to the database and local storage"""
+        try:
+            with self.governor.stage("attendance"):
+                added = self.db.mark_attendance_batch([(mark.student_id, mark.captured_at) for mark in batch])
+                if added is None:
+                    self._unmark(batch)
+                    return
+                if self.local_storage is not None:
+                    self.local_storage.mark_attendance_batch(
+                        [(mark.student_id, mark.name, mark.captured_at) for mark in batch]
+                    )
+        except Exception as e:
+            self.logger.error(f"Error writing {len(batch)} attendance mark(s): {e}")
+            self._unmark(batch)
+            return
+
+        if added:
+            self.logger.info(f"Attendance written: {added} new record(s) from {len(batch)} mark(s)")
@@ -1,12 +1,264 @@
 import sqlite3
 import os
 import logging
+import queue
+import threading
+import numpy as np
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 from ..utils.config import Config
 
+# Attendance counts per day and per student per month, kept up to date by
+# triggers on the attendance table, so summaries never re-aggregate the raw
+# history. Rows whose count drops to zero are removed. Only students in the
+# students table are counted: a removed student's attendance is kept but
+# taken off the rollups, and counted again if the ID is registered again.
+ROLLUP_TABLES = (
+    """
+    CREATE TABLE IF NOT EXISTS attendance_daily (
+        date TEXT NOT NULL,
+        status TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (date, status)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS attendance_student_monthly (
+        student_id TEXT NOT NULL,
+        month TEXT NOT NULL,
+        status TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (student_id, month, status)
+    ) WITHOUT ROWID
+    """,
+)
+
+ROLLUP_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS attendance_rollup_insert AFTER INSERT ON attendance
+    WHEN EXISTS (SELECT 1 FROM students WHERE student_id = NEW.student_id)
+    BEGIN
+        INSERT INTO attendance_daily (date, status, count) VALUES (NEW.date, NEW.status, 1)
+            ON CONFLICT(date, status) DO UPDATE SET count = count + 1;
+        INSERT INTO attendance_student_monthly (student_id, month, status, count)
+            VALUES (NEW.student_id, substr(NEW.date, 1, 7), NEW.status, 1)
+            ON CONFLICT(student_id, month, status) DO UPDATE SET count = count + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS attendance_rollup_delete AFTER DELETE ON attendance
+    WHEN EXISTS (SELECT 1 FROM students WHERE student_id = OLD.student_id)
+    BEGIN
+        UPDATE attendance_daily SET count = count - 1
+            WHERE date = OLD.date AND status = OLD.status;
+        DELETE FROM attendance_daily
+            WHERE date = OLD.date AND status = OLD.status AND count <= 0;
+        UPDATE attendance_student_monthly SET count = count - 1
+            WHERE student_id = OLD.student_id AND month = substr(OLD.date, 1, 7) AND status = OLD.status;
+        DELETE FROM attendance_student_monthly
+            WHERE student_id = OLD.student_id AND month = substr(OLD.date, 1, 7) AND status = OLD.status
+            AND count <= 0;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS attendance_rollup_update AFTER UPDATE OF student_id, date, status ON attendance
+    BEGIN
+        UPDATE attendance_daily SET count = count - 1
+            WHERE date = OLD.date AND status = OLD.status
+            AND EXISTS (SELECT 1 FROM students WHERE student_id = OLD.student_id);
+        DELETE FROM attendance_daily
+            WHERE date = OLD.date AND status = OLD.status AND count <= 0;
+        UPDATE attendance_student_monthly SET count = count - 1
+            WHERE student_id = OLD.student_id AND month = substr(OLD.date, 1, 7) AND status = OLD.status;
+        DELETE FROM attendance_student_monthly
+            WHERE student_id = OLD.student_id AND month = substr(OLD.date, 1, 7) AND status = OLD.status
+            AND count <= 0;
+        INSERT INTO attendance_daily (date, status, count)
+            SELECT NEW.date, NEW.status, 1
+            WHERE EXISTS (SELECT 1 FROM students WHERE student_id = NEW.student_id)
+            ON CONFLICT(date, status) DO UPDATE SET count = count + 1;
+        INSERT INTO attendance_student_monthly (student_id, month, status, count)
+            SELECT NEW.student_id, substr(NEW.date, 1, 7), NEW.status, 1
+            WHERE EXISTS (SELECT 1 FROM students WHERE student_id = NEW.student_id)
+            ON CONFLICT(student_id, month, status) DO UPDATE SET count = count + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS attendance_rollup_student_delete AFTER DELETE ON students
+    BEGIN
+        UPDATE attendance_daily SET count = count - (
+            SELECT COUNT(*) FROM attendance a
+            WHERE a.student_id = OLD.student_id
+            AND a.date = attendance_daily.date AND a.status = attendance_daily.status
+        )
+        WHERE (date, status) IN (SELECT date, status FROM attendance WHERE student_id = OLD.student_id);
+        DELETE FROM attendance_daily
+            WHERE (date, status) IN (SELECT date, status FROM attendance WHERE student_id = OLD.student_id)
+            AND count <= 0;
+        DELETE FROM attendance_student_monthly WHERE student_id = OLD.student_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS attendance_rollup_student_insert AFTER INSERT ON students
+    BEGIN
+        INSERT INTO attendance_daily (date, status, count)
+            SELECT date, status, COUNT(*) FROM attendance WHERE student_id = NEW.student_id
+            GROUP BY date, status
+            ON CONFLICT(date, status) DO UPDATE SET count = count + excluded.count;
+        INSERT INTO attendance_student_monthly (student_id, month, status, count)
+            SELECT student_id, substr(date, 1, 7), status, COUNT(*) FROM attendance
+            WHERE student_id = NEW.student_id
+            GROUP BY student_id, substr(date, 1, 7), status
+            ON CONFLICT(student_id, month, status) DO UPDATE SET count = count + excluded.count;
+    END
+    """,
+)
+
+# Attendance rows the rollups count: those of registered students
+COUNTED_ATTENDANCE = "(SELECT * FROM attendance WHERE student_id IN (SELECT student_id FROM students))"
+
+# Recompute the rollups from the attendance table
+ROLLUP_REBUILD = (
+    "DELETE FROM attendance_daily",
+    "DELETE FROM attendance_student_monthly",
+    f"""
+    INSERT INTO attendance_daily (date, status, count)
+    SELECT date, status, COUNT(*) FROM {COUNTED_ATTENDANCE} GROUP BY date, status
+    """,
+    f"""
+    INSERT INTO attendance_student_monthly (student_id, month, status, count)
+    SELECT student_id, substr(date, 1, 7), status, COUNT(*) FROM {COUNTED_ATTENDANCE}
+    GROUP BY student_id, substr(date, 1, 7), status
+    """,
+)
+
+# Rollup rows that differ from a fresh aggregate of the attendance table
+ROLLUP_MISMATCH_SQL = f"""
+    WITH counted AS {COUNTED_ATTENDANCE}
+    SELECT
+        (SELECT COUNT(*) FROM (
+            SELECT date, status, count FROM attendance_daily
+            EXCEPT SELECT date, status, COUNT(*) FROM counted GROUP BY date, status
+        ))
+        + (SELECT COUNT(*) FROM (
+            SELECT date, status, COUNT(*) FROM counted GROUP BY date, status
+            EXCEPT SELECT date, status, count FROM attendance_daily
+        ))
+        + (SELECT COUNT(*) FROM (
+            SELECT student_id, month, status, count FROM attendance_student_monthly
+            EXCEPT SELECT student_id, substr(date, 1, 7), status, COUNT(*) FROM counted
+            GROUP BY student_id, substr(date, 1, 7), status
+        ))
+        + (SELECT COUNT(*) FROM (
+            SELECT student_id, substr(date, 1, 7), status, COUNT(*) FROM counted
+            GROUP BY student_id, substr(date, 1, 7), status
+            EXCEPT SELECT student_id, month, status, count FROM attendance_student_monthly
+        ))
+"""
+
+# Schema changes made after the original tables, applied in order by
+# initialize_database. The database's PRAGMA user_version is the number of
+# the last one applied.
+MIGRATIONS = (
+    (1, "report indexes", (
+        # Date reports search by date and read the rows in time order;
+        # listing every date reads the same index from the start. With the
+        # report's columns in the index, attendance rows are never looked
+        # up in the table. id gives rows with the same time a fixed order.
+        # The report join finds students by the UNIQUE student_id index.
+        "CREATE INDEX IF NOT EXISTS idx_attendance_date_time "
+        "ON attendance(date, time, id, student_id, status)",
+    )),
+    (2, "attendance rollups", ROLLUP_TABLES + ROLLUP_TRIGGERS + ROLLUP_REBUILD),
+    (3, "encoding images", (
+        # SHA-1 of the image-store image each encoding came from, so a
+        # removed student's images can be deleted once nothing uses them
+        "ALTER TABLE encodings ADD COLUMN image_sha1 TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_encodings_image_sha1 ON encodings(image_sha1)",
+    )),
+    (4, "rollups of registered students", (
+        # Removed students' attendance is kept but no longer counted
+        "DROP TRIGGER IF EXISTS attendance_rollup_insert",
+        "DROP TRIGGER IF EXISTS attendance_rollup_delete",
+        "DROP TRIGGER IF EXISTS attendance_rollup_update",
+    ) + ROLLUP_TRIGGERS + ROLLUP_REBUILD),
+    (5, "meta table", (
+        # One-off facts about the database, e.g. that the file gallery was imported
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID",
+    )),
+)
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# One page of the attendance report, in (date, time, id) order. A page
+# continues after the last row of the previous one (keyset pagination), so
+# every page is an index search however far into the history it is.
+REPORT_PAGE_SQL = """
+    SELECT s.name, s.student_id, a.date, a.time, a.status, a.id
+    FROM attendance a
+    JOIN students s ON a.student_id = s.student_id
+    {where}
+    ORDER BY a.date, a.time, a.id
+    LIMIT ?
+"""
+REPORT_FIRST_PAGE_SQL = REPORT_PAGE_SQL.format(where="")
+REPORT_NEXT_PAGE_SQL = REPORT_PAGE_SQL.format(where="WHERE (a.date, a.time, a.id) > (?, ?, ?)")
+REPORT_DATE_FIRST_PAGE_SQL = REPORT_PAGE_SQL.format(where="WHERE a.date = ?")
+REPORT_DATE_NEXT_PAGE_SQL = REPORT_PAGE_SQL.format(where="WHERE a.date = ? AND (a.time, a.id) > (?, ?)")
+
+MARKED_ON_SQL = "SELECT student_id FROM attendance WHERE date = ?"
+
+DAILY_TOTALS_SQL = """
+    SELECT date, count FROM attendance_daily
+    WHERE date BETWEEN ? AND ? AND status = ?
+    ORDER BY date
+"""
+
+# Reads the whole monthly rollup (one row per student per month attended),
+# so it is not in REPORT_QUERIES
+STUDENT_COUNTS_SQL = """
+    SELECT student_id, SUM(count) FROM attendance_student_monthly
+    WHERE month BETWEEN ? AND ? AND status = ?
+    GROUP BY student_id
+"""
+
+STUDENT_COUNT_SQL = """
+    SELECT student_id, SUM(count) FROM attendance_student_monthly
+    WHERE student_id = ? AND month BETWEEN ? AND ? AND status = ?
+"""
+
+# Queries checked by check_query_plans, with sample parameters
+REPORT_QUERIES = {
+    "report_first_page": (REPORT_FIRST_PAGE_SQL, (100,)),
+    "report_next_page": (REPORT_NEXT_PAGE_SQL, ("2000-01-01", "00:00:00", 0, 100)),
+    "report_date_first_page": (REPORT_DATE_FIRST_PAGE_SQL, ("2000-01-01", 100)),
+    "report_date_next_page": (REPORT_DATE_NEXT_PAGE_SQL, ("2000-01-01", "00:00:00", 0, 100)),
+    "marked_on": (MARKED_ON_SQL, ("2000-01-01",)),
+    "daily_totals": (DAILY_TOTALS_SQL, ("2000-01-01", "2000-12-31", "present")),
+    "student_count": (STUDENT_COUNT_SQL, ("S1", "2000-01", "2000-12", "present")),
+}
+
+def plan_problems(plan):
+    """Return the query plan steps that read a whole table or sort the result
+    
+    A full table scan shows up as ``SCAN <table>`` without an index, and a
+    sort that no index provides as ``USE TEMP B-TREE``. Reading an index in
+    order (``SCAN ... USING ... INDEX``) is how the first page of the
+    all-dates report starts, so it is allowed.
+    """
+    return [
+        detail for detail in plan
+        if (detail.startswith("SCAN ") and "INDEX" not in detail) or "TEMP B-TREE" in detail
+    ]
+
 class DatabaseManager:
-    """Manager for database operations"""
+    """Manager for database operations
+    
+    Connections are long-lived and pooled: each operation borrows one,
+    so SQLite's per-connection statement cache is reused and the file is
+    not reopened for every recognition. The database runs in WAL mode, so
+    report queries never block attendance marking and vice versa.
+    """
     
     def __init__(self):
         self.config = Config()
@@ -16,12 +268,71 @@ class DatabaseManager:
         # Ensure the parent directory exists
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         
+        # Connection settings
+        settings = self.config.get("database")
+        self.pool_size = settings.get("pool_size", 4)
+        self.synchronous = settings.get("synchronous", "NORMAL")
+        self.cache_size_kib = settings.get("cache_size_kib", 8192)
+        self.busy_timeout_ms = settings.get("busy_timeout_ms", 5000)
+        self.cached_statements = settings.get("cached_statements", 256)
+        self.report_page_size = settings.get("report_page_size", 1000)
+        self._pool = queue.LifoQueue()
+        self._pool_lock = threading.Lock()
+        self._closed = False
+        
         self.initialize_database()
     
+    def _connect(self):
+        """Open a connection configured for concurrent use"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,  # Pooled connections move between threads, one at a time
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kib)}")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        return conn
+    
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection for one transaction
+        
+        Like sqlite3's own context manager, the transaction is committed if
+        the block succeeds and rolled back if it raises.
+        """
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        
+        try:
+            with conn:
+                yield conn
+        finally:
+            with self._pool_lock:
+                keep = not self._closed and self._pool.qsize() < self.pool_size
+                if keep:
+                    self._pool.put(conn)
+            if not keep:
+                conn.close()
+    
+    def close(self):
+        """Close the pooled connections; connections in use close when returned"""
+        with self._pool_lock:
+            self._closed = True
+            while True:
+                try:
+                    self._pool.get_nowait().close()
+                except queue.Empty:
+                    break
+    
     def initialize_database(self):
         """Create database tables if they don't exist"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 
                 # Create students table
@@ -47,20 +358,122 @@ class DatabaseManager:
                 )
                 ''')
                 
+                # Create face encodings table (float32 vectors stored as BLOBs)
+                cursor.execute('''
+                CREATE TABLE IF NOT EXISTS encodings (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    student_id TEXT NOT NULL,
+                    encoding BLOB NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (student_id) REFERENCES students(student_id)
+                )
+                ''')
+                cursor.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_encodings_student_id ON encodings(student_id)"
+                )
+                
+                # Students whose encodings were removed or replaced, so other
+                # stations know to reload them
+                cursor.execute('''
+                CREATE TABLE IF NOT EXISTS encoding_tombstones (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    student_id TEXT NOT NULL,
+                    removed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                ''')
+                
                 conn.commit()
+                self._migrate(conn)
                 self.logger.info("Database initialized successfully")
         except sqlite3.Error as e:
             self.logger.error(f"Database initialization error: {e}")
     
-    def register_student(self, name, student_id):
-        """Register a new student"""
+    def _migrate(self, conn):
+        """Apply the migrations the database has not had yet
+        
+        Each migration runs in its own write transaction together with the
+        user_version update, so a station that starts at the same time
+        waits and then finds it already applied.
+        """
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version > SCHEMA_VERSION:
+            self.logger.warning(
+                f"Database schema version {version} is newer than this version's ({SCHEMA_VERSION})"
+            )
+            return
+        
+        for target, description, statements in MIGRATIONS:
+            if target <= version:
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if target > version:
+                    for statement in statements:
+                        conn.execute(statement)
+                    conn.execute(f"PRAGMA user_version = {int(target)}")
+                    version = target
+                    self.logger.info(f"Database migrated to schema version {target}: {description}")
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+    
+    def query_plans(self):
+        """Return the EXPLAIN QUERY PLAN steps of every report query
+        
+        Returns:
+            dict: Query name -> list of plan step descriptions
+        """
+        plans = {}
+        with self.connection() as conn:
+            for name, (sql, params) in REPORT_QUERIES.items():
+                rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+                plans[name] = [row[-1] for row in rows]
+        return plans
+    
+    def check_query_plans(self):
+        """Check that no report query scans a whole table or sorts its result
+        
+        Returns:
+            dict: Query name -> offending plan steps, for each query that does
+        """
+        problems = {}
+        for name, plan in self.query_plans().items():
+            steps = plan_problems(plan)
+            if steps:
+                problems[name] = steps
+        return problems
+    
+    @staticmethod
+    def _encoding_blob(encoding):
+        """Pack a face encoding as a float32 BLOB"""
+        return np.asarray(encoding, dtype=np.float32).tobytes()
+    
+    def register_student(self, name, student_id, encodings=None, images=None):
+        """Register a new student
+        
+        Args:
+            name: Student name
+            student_id: Student ID
+            encodings: Optional face encodings, stored in the same transaction
+                so a student is never saved without their face
+            images: Optional image-store SHA-1 of each encoding's image
+        """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     "INSERT INTO students (name, student_id) VALUES (?, ?)",
                     (name, student_id)
                 )
+                if encodings:
+                    images = images or [None] * len(encodings)
+                    cursor.executemany(
+                        "INSERT INTO encodings (student_id, encoding, image_sha1) VALUES (?, ?, ?)",
+                        [(student_id, self._encoding_blob(encoding), image)
+                         for encoding, image in zip(encodings, images)]
+                    )
                 conn.commit()
                 self.logger.info(f"Student registered: {name} ({student_id})")
                 return True
@@ -71,72 +484,477 @@ class DatabaseManager:
             self.logger.error(f"Error registering student: {e}")
             return False
     
-    def mark_attendance(self, student_id):
-        """Mark attendance for a student"""
+    def get_meta(self, key, default=None):
+        """Return a value from the meta table, or default if it is not set"""
+        try:
+            with self.connection() as conn:
+                row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            self.logger.error(f"Error reading database meta {key}: {e}")
+            return default
+        return row[0] if row else default
+    
+    def import_gallery(self, students, encodings):
+        """Import a file gallery into the encodings table, once
+        
+        The import is recorded in the meta table in the same transaction,
+        so it never runs twice, whatever the encodings table holds.
+        Encodings the database already has for the same student are not
+        added again.
+        
+        Args:
+            students: Iterable of (name, student_id) tuples
+            encodings: Iterable of (student_id, encoding) tuples
+            
+        Returns:
+            int: Number of encodings imported, or None if the import had
+                already been done or failed
+        """
+        try:
+            with self.connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                if conn.execute("SELECT 1 FROM meta WHERE key = 'gallery_imported'").fetchone():
+                    return None
+                conn.executemany("INSERT OR IGNORE INTO students (name, student_id) VALUES (?, ?)", students)
+                rows = [(student_id, self._encoding_blob(encoding)) for student_id, encoding in encodings]
+                present = {
+                    (student_id, blob)
+                    for student_id in {student_id for student_id, _ in rows}
+                    for (blob,) in conn.execute("SELECT encoding FROM encodings WHERE student_id = ?", (student_id,))
+                }
+                rows = [row for row in rows if row not in present]
+                conn.executemany("INSERT INTO encodings (student_id, encoding) VALUES (?, ?)", rows)
+                conn.execute("INSERT INTO meta (key, value) VALUES ('gallery_imported', datetime('now'))")
+                conn.commit()
+                return len(rows)
+        except sqlite3.Error as e:
+            self.logger.error(f"Error importing the face gallery: {e}")
+            return None
+    
+    def student_exists(self, student_id):
+        """Check whether a student ID is registered"""
+        try:
+            with self.connection() as conn:
+                row = conn.execute("SELECT 1 FROM students WHERE student_id = ?", (student_id,)).fetchone()
+                return row is not None
+        except sqlite3.Error as e:
+            self.logger.error(f"Error looking up student: {e}")
+            return False
+    
+    def register_students(self, students, encodings=None):
+        """Register many students in a single transaction
+        
+        Args:
+            students: Iterable of (name, student_id) tuples
+            encodings: Optional iterable of (student_id, encoding) or
+                (student_id, encoding, image SHA-1) tuples, stored in the
+                same transaction
+            
+        Returns:
+            int: Number of new students; existing IDs are left unchanged
+        """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO students (name, student_id) VALUES (?, ?)",
+                    students
+                )
+                added = cursor.rowcount
+                if encodings:
+                    cursor.executemany(
+                        "INSERT INTO encodings (student_id, encoding, image_sha1) VALUES (?, ?, ?)",
+                        [(student_id, self._encoding_blob(encoding), image[0] if image else None)
+                         for student_id, encoding, *image in encodings]
+                    )
+                conn.commit()
+                self.logger.info(f"Registered {added} new student(s)")
+                return added
+        except sqlite3.Error as e:
+            self.logger.error(f"Error registering students: {e}")
+            return 0
+    
+    def remove_student(self, student_id):
+        """Delete a student and their face encodings
+        
+        Attendance history is kept. A tombstone is recorded in the same
+        transaction so other stations drop the student's faces.
+        
+        Returns:
+            bool: True if the student existed
+        """
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM students WHERE student_id = ?", (student_id,))
+                found = cursor.rowcount > 0
+                cursor.execute("DELETE FROM encodings WHERE student_id = ?", (student_id,))
+                cursor.execute("INSERT INTO encoding_tombstones (student_id) VALUES (?)", (student_id,))
+                conn.commit()
+                if found:
+                    self.logger.info(f"Student removed: {student_id}")
+                return found
+        except sqlite3.Error as e:
+            self.logger.error(f"Error removing student: {e}")
+            return False
+    
+    def replace_student_faces(self, student_id, encodings, name=None, images=None):
+        """Replace all of a student's face encodings in one transaction
+        
+        Args:
+            student_id: Student ID
+            encodings: The new face encodings
+            name: New name; the student is registered if they are not yet.
+                With None the current name is kept.
+            images: Optional image-store SHA-1 of each new encoding's image
                 
-                # Check if student exists
-                cursor.execute("SELECT name FROM students WHERE student_id = ?", (student_id,))
-                student = cursor.fetchone()
-                
-                if not student:
+        Returns:
+            bool: True on success
+        """
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                if name is not None:
+                    cursor.execute("""
+                        INSERT INTO students (name, student_id) VALUES (?, ?)
+                        ON CONFLICT(student_id) DO UPDATE SET name = excluded.name
+                    """, (name, student_id))
+                elif cursor.execute("SELECT 1 FROM students WHERE student_id = ?", (student_id,)).fetchone() is None:
                     self.logger.warning(f"Student ID {student_id} not found in database")
                     return False
-                
-                # Get current date and time
-                current_date = datetime.now().strftime("%Y-%m-%d")
-                current_time = datetime.now().strftime("%H:%M:%S")
-                
-                # Check if attendance already marked for today
-                cursor.execute(
-                    "SELECT id FROM attendance WHERE student_id = ? AND date = ?", 
-                    (student_id, current_date)
-                )
-                
-                if cursor.fetchone():
-                    self.logger.info(f"Attendance already marked for student {student_id} today")
-                    return True
-                
-                # Mark attendance
-                cursor.execute(
-                    "INSERT INTO attendance (student_id, date, time, status) VALUES (?, ?, ?, ?)",
-                    (student_id, current_date, current_time, "present")
+                cursor.execute("DELETE FROM encodings WHERE student_id = ?", (student_id,))
+                cursor.execute("INSERT INTO encoding_tombstones (student_id) VALUES (?)", (student_id,))
+                images = images or [None] * len(encodings)
+                cursor.executemany(
+                    "INSERT INTO encodings (student_id, encoding, image_sha1) VALUES (?, ?, ?)",
+                    [(student_id, self._encoding_blob(encoding), image)
+                     for encoding, image in zip(encodings, images)]
                 )
                 conn.commit()
-                self.logger.info(f"Attendance marked for student {student_id} at {current_time}")
+                self.logger.info(f"Replaced face encodings of student {student_id}")
                 return True
-                
         except sqlite3.Error as e:
-            self.logger.error(f"Error marking attendance: {e}")
+            self.logger.error(f"Error replacing face encodings: {e}")
             return False
     
-    def get_attendance_report(self, date=None):
-        """Get attendance report for a specific date or all dates"""
+    def student_images(self, student_id):
+        """Return the image-store SHA-1s of a student's face encodings"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                
-                if date:
-                    cursor.execute("""
-                        SELECT s.name, s.student_id, a.date, a.time, a.status
-                        FROM attendance a
-                        JOIN students s ON a.student_id = s.student_id
-                        WHERE a.date = ?
-                        ORDER BY a.time
-                    """, (date,))
-                else:
-                    cursor.execute("""
-                        SELECT s.name, s.student_id, a.date, a.time, a.status
-                        FROM attendance a
-                        JOIN students s ON a.student_id = s.student_id
-                        ORDER BY a.date, a.time
-                    """)
+            with self.connection() as conn:
+                rows = conn.execute(
+                    "SELECT DISTINCT image_sha1 FROM encodings WHERE student_id = ? AND image_sha1 IS NOT NULL",
+                    (student_id,)
+                ).fetchall()
+        except sqlite3.Error as e:
+            self.logger.error(f"Error loading images of student {student_id}: {e}")
+            return set()
+        return {row[0] for row in rows}
+    
+    def images_in_use(self, digests):
+        """Return which of the given image SHA-1s some face encoding still uses"""
+        digests = list(digests)
+        try:
+            with self.connection() as conn:
+                return {
+                    digest for digest in digests
+                    if conn.execute("SELECT 1 FROM encodings WHERE image_sha1 = ?", (digest,)).fetchone()
+                }
+        except sqlite3.Error as e:
+            self.logger.error(f"Error looking up face encoding images: {e}")
+            # Treat every image as in use rather than delete one by mistake
+            return set(digests)
+    
+    def load_tombstones(self, since_id=0):
+        """Return students removed or re-enrolled since a tombstone ID
+        
+        Returns:
+            tuple: (list of student IDs, highest tombstone ID seen)
+        """
+        try:
+            with self.connection() as conn:
+                rows = conn.execute(
+                    "SELECT id, student_id FROM encoding_tombstones WHERE id > ? ORDER BY id",
+                    (since_id,)
+                ).fetchall()
+        except sqlite3.Error as e:
+            self.logger.error(f"Error loading encoding tombstones: {e}")
+            rows = []
+        
+        if not rows:
+            return [], since_id
+        return [row[1] for row in rows], rows[-1][0]
+    
+    def load_encodings(self, since_rowid=0, student_ids=None, until_rowid=None):
+        """Load face encodings with one query
+        
+        The BLOBs of all matching rows are concatenated and decoded with a
+        single np.frombuffer call.
+        
+        Args:
+            since_rowid: Only return rows with a larger rowid, for incremental loads
+            student_ids: Only return rows of these students
+            until_rowid: Only return rows up to this rowid
+            
+        Returns:
+            tuple: (float32 (N, 128) matrix, names, student IDs, highest rowid seen)
+        """
+        query = """
+            SELECT e.id, s.name, e.student_id, e.encoding
+            FROM encodings e
+            JOIN students s ON e.student_id = s.student_id
+            WHERE e.id > ?
+        """
+        params = [since_rowid]
+        if student_ids is not None:
+            student_ids = list(student_ids)
+            query += f" AND e.student_id IN ({', '.join('?' * len(student_ids))})"
+            params += student_ids
+        if until_rowid is not None:
+            query += " AND e.id <= ?"
+            params.append(until_rowid)
+        query += " ORDER BY e.id"
+        
+        try:
+            with self.connection() as conn:
+                rows = conn.execute(query, params).fetchall()
+        except sqlite3.Error as e:
+            self.logger.error(f"Error loading face encodings: {e}")
+            rows = []
+        
+        if not rows:
+            return np.empty((0, 128), dtype=np.float32), [], [], since_rowid
+        
+        encodings = np.frombuffer(b"".join(row[3] for row in rows), dtype=np.float32).reshape(len(rows), -1)
+        names = [row[1] for row in rows]
+        ids = [row[2] for row in rows]
+        return encodings, names, ids, rows[-1][0]
+    
+    def count_encodings(self):
+        """Return the number of stored face encodings"""
+        try:
+            with self.connection() as conn:
+                return conn.execute("SELECT COUNT(*) FROM encodings").fetchone()[0]
+        except sqlite3.Error as e:
+            self.logger.error(f"Error counting face encodings: {e}")
+            return 0
+    
+    def mark_attendance(self, student_id, timestamp=None):
+        """Mark attendance for a student
+        
+        Args:
+            student_id: Student ID
+            timestamp: Epoch seconds when the student was seen (default: now)
+            
+        Returns:
+            bool: True if a new record was added; False if the student was
+                already marked that day, is unknown, or on error
+        """
+        return bool(self.mark_attendance_batch([(student_id, timestamp)]))
+    
+    def mark_attendance_batch(self, marks):
+        """Mark attendance for several students in one transaction
+        
+        Each mark is a single idempotent statement: the student lookup,
+        the already-marked check and the insert happen in one round trip.
+        
+        Args:
+            marks: Iterable of (student_id, timestamp) tuples, with the
+                epoch seconds when each student was seen (None for now)
                 
-                return [dict(row) for row in cursor.fetchall()]
+        Returns:
+            int: Number of new attendance records, or None if the write
+                failed and nothing was recorded
+        """
+        rows = []
+        for student_id, timestamp in marks:
+            seen_at = datetime.fromtimestamp(timestamp) if timestamp is not None else datetime.now()
+            rows.append((seen_at.strftime("%Y-%m-%d"), seen_at.strftime("%H:%M:%S"), student_id))
+        
+        try:
+            with self.connection() as conn:
+                cursor = conn.executemany("""
+                    INSERT INTO attendance (student_id, date, time, status)
+                    SELECT student_id, ?, ?, 'present' FROM students WHERE student_id = ?
+                    ON CONFLICT(student_id, date) DO NOTHING
+                """, rows)
+                added = max(cursor.rowcount, 0)
                 
+                if added < len(rows):
+                    # Some marks were skipped: already marked, or unknown students
+                    unknown = sorted(
+                        student_id for student_id in {row[2] for row in rows}
+                        if not conn.execute("SELECT 1 FROM students WHERE student_id = ?", (student_id,)).fetchone()
+                    )
+                    if unknown:
+                        self.logger.warning(f"Student ID(s) not found in database, attendance not marked: "
+                                            f"{', '.join(map(str, unknown))}")
+                return added
+        except sqlite3.Error as e:
+            self.logger.error(f"Error marking attendance: {e}")
+            return None
+    
+    def students_marked_on(self, date):
+        """Return the IDs of students with attendance on a date (YYYY-MM-DD)"""
+        try:
+            with self.connection() as conn:
+                rows = conn.execute(MARKED_ON_SQL, (date,)).fetchall()
+        except sqlite3.Error as e:
+            self.logger.error(f"Error loading attendance for {date}: {e}")
+            return set()
+        return {row[0] for row in rows}
+    
+    def get_attendance_page(self, date=None, page_size=None, cursor=None):
+        """Get one page of the attendance report
+        
+        Args:
+            date: Only this date (YYYY-MM-DD), or None for all dates
+            page_size: Maximum number of records (default: database.report_page_size)
+            cursor: The cursor returned with the previous page, or None for
+                the first page
+            
+        Returns:
+            tuple: (records, cursor for the next page or None after the last)
+            
+        A database error is logged and raised, so a caller paging through
+        the report cannot mistake it for the end of the records.
+        """
+        page_size = page_size or self.report_page_size
+        if cursor is None:
+            sql, params = (REPORT_DATE_FIRST_PAGE_SQL, (date,)) if date else (REPORT_FIRST_PAGE_SQL, ())
+        elif date:
+            sql, params = REPORT_DATE_NEXT_PAGE_SQL, (date, cursor[1], cursor[2])
+        else:
+            sql, params = REPORT_NEXT_PAGE_SQL, tuple(cursor)
+        
+        try:
+            with self.connection() as conn:
+                # One extra row tells whether there is another page
+                rows = conn.execute(sql, params + (page_size + 1,)).fetchall()
         except sqlite3.Error as e:
             self.logger.error(f"Error getting attendance report: {e}")
+            raise
+        
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = (rows[-1][2], rows[-1][3], rows[-1][5])
+        records = [
+            {"name": name, "student_id": student_id, "date": day, "time": time, "status": status}
+            for name, student_id, day, time, status, _ in rows
+        ]
+        return records, next_cursor
+    
+    def iter_attendance_report(self, date=None, chunk_size=None):
+        """Stream the attendance report in chunks
+        
+        Each chunk is one page query on a briefly borrowed connection, so a
+        slow consumer never holds a connection or a read transaction open.
+        
+        Args:
+            date: Only this date (YYYY-MM-DD), or None for all dates
+            chunk_size: Records per chunk (default: database.report_page_size)
+            
+        Yields:
+            list: Up to chunk_size records, in date and time order
+            
+        A page that fails raises sqlite3.Error from the iterator.
+        """
+        cursor = None
+        while True:
+            records, cursor = self.get_attendance_page(date, chunk_size, cursor)
+            if records:
+                yield records
+            if cursor is None:
+                return
+    
+    def get_attendance_report(self, date=None):
+        """Get attendance report for a specific date or all dates
+        
+        This builds the whole report in memory; prefer iter_attendance_report
+        or get_attendance_page for long histories. Returns an empty list on
+        a database error.
+        """
+        try:
+            return [record for chunk in self.iter_attendance_report(date) for record in chunk]
+        except sqlite3.Error:
             return []
+    
+    def daily_attendance(self, start=None, end=None, status="present"):
+        """Number of students with attendance on each day, from the daily rollup
+        
+        Removed students are not counted; their attendance rows are kept.
+        
+        Args:
+            start: First date (YYYY-MM-DD), or None for the earliest
+            end: Last date (YYYY-MM-DD), or None for the latest
+            status: Attendance status to count
+            
+        Returns:
+            list: (date, count) tuples in date order, for days with attendance
+        """
+        try:
+            with self.connection() as conn:
+                rows = conn.execute(
+                    DAILY_TOTALS_SQL, (start or "0000-00-00", end or "9999-12-31", status)
+                ).fetchall()
+        except sqlite3.Error as e:
+            self.logger.error(f"Error getting daily attendance: {e}")
+            return []
+        return [tuple(row) for row in rows]
+    
+    def student_attendance_counts(self, start_month=None, end_month=None, student_id=None, status="present"):
+        """Number of days each student attended, from the monthly rollup
+        
+        Removed students are not counted; their attendance rows are kept.
+        
+        Args:
+            start_month: First month (YYYY-MM), or None for the earliest
+            end_month: Last month (YYYY-MM), or None for the latest
+            student_id: Only this student, or None for every student
+            status: Attendance status to count
+            
+        Returns:
+            dict: student_id -> days, for students with any in the range
+        """
+        months = (start_month or "0000-00", end_month or "9999-12")
+        try:
+            with self.connection() as conn:
+                if student_id:
+                    rows = conn.execute(STUDENT_COUNT_SQL, (student_id,) + months + (status,)).fetchall()
+                else:
+                    rows = conn.execute(STUDENT_COUNTS_SQL, months + (status,)).fetchall()
+        except sqlite3.Error as e:
+            self.logger.error(f"Error getting student attendance counts: {e}")
+            return {}
+        return {student: days for student, days in rows if student is not None}
+    
+    def rebuild_rollups(self):
+        """Recompute the attendance rollups from the registered students' attendance
+        
+        Returns:
+            bool: True if the rollups were rebuilt
+        """
+        try:
+            with self.connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                for statement in ROLLUP_REBUILD:
+                    conn.execute(statement)
+                conn.commit()
+        except sqlite3.Error as e:
+            self.logger.error(f"Error rebuilding attendance rollups: {e}")
+            return False
+        self.logger.info("Attendance rollups rebuilt")
+        return True
+    
+    def check_rollups(self):
+        """Compare the rollups with a fresh aggregate of the attendance table
+        
+        Returns:
+            int: Number of rollup rows that are wrong or missing, or None on error
+        """
+        try:
+            with self.connection() as conn:
+                return conn.execute(ROLLUP_MISMATCH_SQL).fetchone()[0]
+        except sqlite3.Error as e:
+            self.logger.error(f"Error checking attendance rollups: {e}")
+            return None
@@ -1 +1,4 @@
 from .recognizer import FaceRecognizer
+from .gallery import Gallery
+from .enrollment import EnrollmentWorker
+from .reencode import ReencodeJob
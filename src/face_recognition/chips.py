@@ -0,0 +1,77 @@
+import cv2
+import numpy as np
+import os
+from pathlib import Path
+
+# dlib and face_recognition are imported inside the functions that use
+# them, since importing face_recognition loads its model files
+
+# dlib's face encoder works on 150x150 chips aligned with this padding, so
+# a cached chip can be encoded again without detection or alignment
+CHIP_SIZE = 150
+CHIP_PADDING = 0.25
+
+
+def encode_with_chip(rgb_image, landmark_model="small", num_jitters=1):
+    """Find the first face in an image, align it into a chip and encode it
+
+    Gives the same encoding as face_recognition.face_encodings, and also
+    returns the aligned chip it was computed from.
+
+    Returns:
+        tuple: (encoding, RGB chip) or (None, None) if no face was found
+    """
+    import dlib
+    import face_recognition
+    locations = face_recognition.face_locations(rgb_image)
+    if not locations:
+        return None, None
+    landmarks = face_recognition.api._raw_face_landmarks(rgb_image, locations[:1], landmark_model)
+    chip = dlib.get_face_chip(rgb_image, landmarks[0], size=CHIP_SIZE, padding=CHIP_PADDING)
+    return encode_chip(chip, num_jitters), chip
+
+
+def encode_chip(chip, num_jitters=1):
+    """Encode an aligned face chip, skipping detection"""
+    import face_recognition
+    return np.array(face_recognition.api.face_encoder.compute_face_descriptor(chip, num_jitters))
+
+
+class ChipCache:
+    """Aligned face chips, keyed by the SHA-1 of the photo they came from
+
+    Chips are stored losslessly as ``<dir>/<sha1[:2]>/<sha1>.png`` so that
+    re-encoding from a chip gives exactly what encoding the photo would.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def path(self, digest):
+        """Path of the chip for a photo digest"""
+        return self.directory / digest[:2] / f"{digest}.png"
+
+    def has(self, digest):
+        """Whether a chip is cached for a photo digest"""
+        return self.path(digest).exists()
+
+    def save(self, digest, chip):
+        """Store an RGB chip; written to a temporary file and renamed into place"""
+        path = self.path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp.png")
+        if not cv2.imwrite(str(tmp_path), cv2.cvtColor(chip, cv2.COLOR_RGB2BGR)):
+            raise OSError(f"Could not write face chip {path}")
+        os.replace(tmp_path, path)
+
+    def discard(self, digest):
+        """Delete the chip for a photo digest, if there is one"""
+        self.path(digest).unlink(missing_ok=True)
+
+    def load(self, digest):
+        """Return the RGB chip for a photo digest, or None"""
+        path = self.path(digest)
+        chip = cv2.imread(str(path)) if path.exists() else None
+        if chip is None:
+            return None
+        return cv2.cvtColor(chip, cv2.COLOR_BGR2RGB)
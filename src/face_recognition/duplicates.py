@@ -0,0 +1,129 @@
+import numpy as np
+from collections import namedtuple
+from .gallery import ENCODING_SIZE
+
+DuplicatePair = namedtuple("DuplicatePair", ["student_a", "name_a", "student_b", "name_b", "distance", "row_a", "row_b"])
+
+DEFAULT_BLOCK_SIZE = 2048
+
+
+def _close_rows(queries, encodings, tolerance, block_size, skip_lower=False, progress=None):
+    """Yield (query rows, gallery rows) of pairs within tolerance, block by block
+
+    Squared distances come from one matrix product per block,
+    |q|^2 + |g|^2 - 2 q.g, so working memory is block_size^2 floats however
+    large the inputs are. With skip_lower, queries and encodings are the same
+    matrix and only pairs with query row < gallery row are reported.
+    """
+    # A little slack for float32 rounding; callers confirm candidates exactly
+    threshold = tolerance * tolerance + 1e-4
+    buffer = np.empty((min(block_size, len(queries)), min(block_size, len(encodings))), dtype=np.float32)
+    for q_start in range(0, len(queries), block_size):
+        q_block = np.asarray(queries[q_start:q_start + block_size], dtype=np.float32)
+        q_norms = np.einsum("ij,ij->i", q_block, q_block)
+        g_first = q_start if skip_lower else 0
+        for g_start in range(g_first, len(encodings), block_size):
+            g_block = np.asarray(encodings[g_start:g_start + block_size], dtype=np.float32)
+            g_norms = np.einsum("ij,ij->i", g_block, g_block)
+
+            squared = np.matmul(q_block, g_block.T, out=buffer[:len(q_block), :len(g_block)])
+            squared *= -2.0
+            squared += q_norms[:, None]
+            squared += g_norms[None, :]
+            close = squared <= threshold
+            if skip_lower and g_start == q_start:
+                close &= np.triu(np.ones(close.shape, dtype=bool), k=1)
+
+            rows, cols = np.nonzero(close)
+            if len(rows):
+                yield rows + q_start, cols + g_start
+        if progress is not None:
+            progress(q_start + len(q_block), len(queries))
+
+
+def _exact_distances(a, b):
+    """Euclidean distances between paired rows, to confirm GEMM candidates"""
+    return np.linalg.norm(np.asarray(a, dtype=np.float64) - np.asarray(b, dtype=np.float64), axis=1)
+
+
+def find_duplicate_identities(gallery, tolerance, block_size=DEFAULT_BLOCK_SIZE, progress=None):
+    """Find different student IDs whose faces are within tolerance
+
+    Every pair of gallery rows is compared with a blocked matrix product.
+    Candidates are confirmed with an exact distance, and for each pair of
+    student IDs only the closest pair of rows is reported.
+
+    Args:
+        gallery: Gallery to check
+        tolerance: Match tolerance, as used for recognition
+        block_size: Rows per block; memory use grows with its square
+        progress: Optional callable(rows done, total rows)
+
+    Returns:
+        list: DuplicatePair tuples, closest first
+    """
+    # Compare student IDs as integers; two identities can share an ID if the
+    # name changed, and those rows are the same person by definition
+    student_codes = {}
+    label_codes = np.array(
+        [student_codes.setdefault(student_id, len(student_codes)) for _, student_id in gallery.identities],
+        dtype=np.int64,
+    )
+    codes = label_codes[gallery.labels] if len(gallery) else np.empty(0, dtype=np.int64)
+
+    best = {}
+    pairs = _close_rows(gallery.encodings, gallery.encodings, tolerance, block_size, skip_lower=True, progress=progress)
+    for rows, cols in pairs:
+        different = codes[rows] != codes[cols]
+        rows, cols = rows[different], cols[different]
+        if not len(rows):
+            continue
+        distances = _exact_distances(gallery.encodings[rows], gallery.encodings[cols])
+        for row, col, distance in zip(rows.tolist(), cols.tolist(), distances.tolist()):
+            if distance > tolerance:
+                continue
+            key = tuple(sorted((codes[row], codes[col])))
+            if key not in best or distance < best[key][0]:
+                best[key] = (distance, row, col)
+
+    pairs = []
+    for distance, row, col in sorted(best.values()):
+        name_a, student_a = gallery.identity(row)
+        name_b, student_b = gallery.identity(col)
+        pairs.append(DuplicatePair(student_a, name_a, student_b, name_b, distance, row, col))
+    return pairs
+
+
+def find_conflicts(gallery, encodings, ids, tolerance, block_size=DEFAULT_BLOCK_SIZE, names=None):
+    """Check new face encodings against the gallery before they are enrolled
+
+    With names, the new encodings are also checked against each other, as
+    if they were enrolled in order: a face matching an earlier one in the
+    batch under a different student ID conflicts with it.
+
+    Returns:
+        list: For each encoding, the closest (name, student_id, distance) of
+            a different student within tolerance, or None
+    """
+    queries = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+    conflicts = [None] * len(queries)
+
+    def record(row, name, student_id, distance):
+        if distance <= tolerance and student_id != ids[row] \
+                and (conflicts[row] is None or distance < conflicts[row][2]):
+            conflicts[row] = (name, student_id, distance)
+
+    if len(gallery) and len(queries):
+        gallery_ids = np.array([student_id for _, student_id in gallery.identities], dtype=object)
+        for rows, cols in _close_rows(queries, gallery.encodings, tolerance, block_size):
+            distances = _exact_distances(queries[rows], gallery.encodings[cols])
+            for row, col, distance in zip(rows.tolist(), cols.tolist(), distances.tolist()):
+                record(row, gallery.identity(col)[0], gallery_ids[gallery.labels[col]], distance)
+
+    if names is not None and len(queries) > 1:
+        # Pairs come out with the earlier entry first; the later one conflicts
+        for rows, cols in _close_rows(queries, queries, tolerance, block_size, skip_lower=True):
+            distances = _exact_distances(queries[rows], queries[cols])
+            for row, col, distance in zip(rows.tolist(), cols.tolist(), distances.tolist()):
+                record(col, names[row], ids[row], distance)
+    return conflicts
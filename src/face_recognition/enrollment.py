@@ -0,0 +1,161 @@
+import logging
+import queue
+import threading
+from collections import namedtuple
+from ..utils.resource_governor import ResourceGovernor
+
+EnrollmentJob = namedtuple("EnrollmentJob", ["image", "name", "student_id", "callback"])
+
+
+class EnrollmentWorker:
+    """Run face enrollment on a background thread
+
+    Jobs are queued by the GUI and processed in order. Whatever has piled up
+    while the worker was busy is enrolled as one batch, so registering several
+    students back to back costs a single gallery update.
+
+    When a DatabaseManager is given, each student is registered in the same
+    transaction as their face encoding, after the face has been found, so the
+    database never holds a student without a face.
+    """
+
+    def __init__(self, recognizer, db=None, batch_size=16):
+        self.recognizer = recognizer
+        self.db = db
+        self.batch_size = batch_size
+        self.logger = logging.getLogger("attendance_system")
+        self.governor = ResourceGovernor()
+
+        self._queue = queue.Queue()
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+
+        self._thread = threading.Thread(target=self._run, name="enrollment-worker", daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self):
+        """Number of submitted jobs that have not completed yet"""
+        with self._pending_lock:
+            return self._pending
+
+    def submit(self, image, name, student_id, callback=None):
+        """Queue a face for enrollment
+
+        Args:
+            image: BGR image containing the student's face
+            name: Student name
+            student_id: Student ID
+            callback: Optional callable(success, name, student_id, error),
+                invoked on the worker thread once the job has finished
+        """
+        with self._pending_lock:
+            self._pending += 1
+        self._queue.put(EnrollmentJob(image, name, student_id, callback))
+        self.logger.info(f"Queued enrollment for {name} ({student_id})")
+
+    def stop(self, timeout=None):
+        """Finish the queued jobs and stop the worker thread"""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _next_batch(self):
+        """Block for one job, then take any others that are already queued
+
+        Returns:
+            tuple: (batch, stopping)
+        """
+        job = self._queue.get()
+        if job is None:
+            return [], True
+
+        batch = [job]
+        while len(batch) < self.batch_size:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                return batch, True
+            batch.append(job)
+        return batch, False
+
+    def _run(self):
+        """Worker loop"""
+        self.governor.pin_current_thread()
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            if not batch:
+                continue
+
+            try:
+                with self.governor.stage("enroll"):
+                    results = self._enroll(batch)
+            except Exception as e:
+                self.logger.error(f"Error enrolling faces: {e}")
+                results = [(False, str(e))] * len(batch)
+
+            with self._pending_lock:
+                self._pending -= len(batch)
+
+            for job, (success, error) in zip(batch, results):
+                if job.callback is None:
+                    continue
+                try:
+                    job.callback(success, job.name, job.student_id, error)
+                except Exception as e:
+                    self.logger.error(f"Error in enrollment callback: {e}")
+
+    def _enroll(self, batch):
+        """Enroll a batch of jobs
+
+        Returns:
+            list: (success, error message or None) for each job
+        """
+        no_face = "No face found in the photo"
+        if self.db is None:
+            return self.recognizer.add_faces_with_errors([(job.image, job.name, job.student_id) for job in batch])
+
+        results = []
+        jobs = []
+        for job in batch:
+            if self.db.student_exists(job.student_id):
+                results.append((False, f"Student ID {job.student_id} already exists"))
+            else:
+                results.append(None)
+                jobs.append(job)
+
+        encoded = self.recognizer.encode_faces([(job.image, job.name, job.student_id) for job in jobs])
+        found = [k for k, (encoding, _, _) in enumerate(encoded) if encoding is not None]
+        duplicates = dict(zip(found, self.recognizer.find_duplicates(
+            [encoded[k][0] for k in found], [jobs[k].name for k in found], [jobs[k].student_id for k in found]
+        )))
+
+        encodings, names, ids, sources, images = [], [], [], [], []
+        pending = iter(enumerate(encoded))
+        for i, job in enumerate(batch):
+            if results[i] is not None:
+                continue
+            k, (encoding, source, image) = next(pending)
+            duplicate = duplicates.get(k)
+            if encoding is None:
+                results[i] = (False, no_face)
+            elif duplicate is not None and self.recognizer.duplicate_check == "reject":
+                results[i] = (False, f"This face is already enrolled as {duplicate[0]} ({duplicate[1]})")
+            elif not self.db.register_student(job.name, job.student_id, encodings=[encoding],
+                                              images=[source["sha1"]]):
+                results[i] = (False, f"Student ID {job.student_id} already exists or storage error occurred")
+            else:
+                results[i] = (True, None)
+                encodings.append(encoding)
+                names.append(job.name)
+                ids.append(job.student_id)
+                sources.append(source)
+                images.append(image)
+
+        # Only accepted faces get their images stored
+        if encodings:
+            self.recognizer.add_encodings(encodings, names, ids, sources)
+            self.recognizer.store_images(images)
+        return results
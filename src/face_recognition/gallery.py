@@ -0,0 +1,196 @@
+import numpy as np
+
+ENCODING_SIZE = 128
+
+
+class Gallery:
+    """Immutable snapshot of the known faces used for matching
+
+    A gallery holds an (N, 128) encodings matrix, an int32 label per row and
+    a table of (name, student_id) identities the labels index into. Snapshots
+    are never modified in place: every mutation builds a new Gallery, so a
+    reader that grabbed a reference always sees a consistent set of rows.
+
+    Each snapshot also has a student ID -> rows index. It is carried over
+    incrementally by ``extended`` and ``without_student`` and built on first
+    use otherwise.
+    """
+
+    __slots__ = ("encodings", "labels", "identities", "_index")
+
+    def __init__(self, encodings=None, labels=None, identities=(), index=None):
+        if encodings is None:
+            encodings = np.empty((0, ENCODING_SIZE), dtype=np.float32)
+        if labels is None:
+            labels = np.empty(0, dtype=np.int32)
+
+        encodings = np.asarray(encodings)
+        labels = np.asarray(labels, dtype=np.int32)
+        if encodings.ndim != 2 or len(encodings) != len(labels):
+            raise ValueError("Gallery encodings and labels must have matching lengths")
+
+        # Freeze the arrays so nobody can mutate a published snapshot
+        encodings.setflags(write=False)
+        labels.setflags(write=False)
+
+        object.__setattr__(self, "encodings", encodings)
+        object.__setattr__(self, "labels", labels)
+        object.__setattr__(self, "identities", tuple(identities))
+        object.__setattr__(self, "_index", index)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Gallery snapshots are immutable")
+
+    def __len__(self):
+        return len(self.labels)
+
+    @classmethod
+    def from_lists(cls, encodings, names, ids):
+        """Build a gallery from parallel lists of encodings, names and IDs"""
+        return cls().extended(encodings, names, ids)
+
+    @property
+    def names(self):
+        """Name of every row, in row order"""
+        return [self.identities[label][0] for label in self.labels]
+
+    @property
+    def ids(self):
+        """Student ID of every row, in row order"""
+        return [self.identities[label][1] for label in self.labels]
+
+    def identity(self, row):
+        """Return the (name, student_id) pair for a gallery row"""
+        return self.identities[self.labels[row]]
+
+    def _row_index(self):
+        """Return the student ID -> [rows] index, building it if needed"""
+        if self._index is None:
+            index = {}
+            for row, label in enumerate(self.labels.tolist()):
+                index.setdefault(self.identities[label][1], []).append(row)
+            object.__setattr__(self, "_index", index)
+        return self._index
+
+    def rows_for(self, student_id):
+        """Return the gallery rows of a student"""
+        return list(self._row_index().get(student_id, ()))
+
+    def extended(self, encodings, names, ids):
+        """Return a new gallery with the given entries appended
+
+        All entries are added in a single copy, so enrolling a batch costs one
+        new snapshot rather than one per face.
+        """
+        if len(encodings) == 0:
+            return self
+
+        identities = list(self.identities)
+        index = {identity: label for label, identity in enumerate(identities)}
+        new_labels = []
+        for name, student_id in zip(names, ids):
+            key = (name, student_id)
+            if key not in index:
+                index[key] = len(identities)
+                identities.append(key)
+            new_labels.append(index[key])
+
+        index = None
+        if self._index is not None:
+            # Lists are copied before they change; older snapshots share the rest
+            index = dict(self._index)
+            copied = set()
+            for row, student_id in enumerate(ids, start=len(self)):
+                if student_id not in copied:
+                    index[student_id] = list(index.get(student_id, ()))
+                    copied.add(student_id)
+                index[student_id].append(row)
+
+        new_encodings = np.asarray(encodings, dtype=self.encodings.dtype).reshape(-1, ENCODING_SIZE)
+        return Gallery(
+            np.concatenate([self.encodings, new_encodings]),
+            np.concatenate([self.labels, np.asarray(new_labels, dtype=np.int32)]),
+            identities,
+            index,
+        )
+
+    def without_student(self, student_id):
+        """Return a new gallery without a student's rows
+
+        Each removed row is filled by moving the current last row into it
+        (swap-with-last), so only as many rows move as are removed instead of
+        shifting everything after them. Rows are removed from the highest
+        down, which makes the result deterministic: replaying the same
+        removal on the same gallery yields the same row order.
+
+        Returns:
+            tuple: (gallery, moves) where moves is a list of (old row,
+                new row) for every surviving row that changed position
+        """
+        index = self._row_index()
+        removed = sorted(index.get(student_id, ()), reverse=True)
+        if not removed:
+            return self, []
+
+        # One copy for the new snapshot; the row moves themselves are O(removed)
+        encodings = np.array(self.encodings)
+        labels = np.array(self.labels)
+        index = dict(index)
+        del index[student_id]
+
+        origin = {}  # new row -> row it had in this snapshot
+        last = len(labels)
+        for row in removed:
+            last -= 1
+            if row == last:
+                continue
+            encodings[row] = encodings[last]
+            labels[row] = labels[last]
+            origin[row] = origin.pop(last, last)
+            moved_id = self.identities[labels[row]][1]
+            index[moved_id] = [row if r == last else r for r in index[moved_id]]
+
+        gallery = Gallery(encodings[:last], labels[:last], self.identities, index)
+        return gallery, sorted((old, new) for new, old in origin.items())
+
+    def subset(self, rows):
+        """Return a new gallery holding only the given rows, in that order
+
+        Identities that no longer have any rows are dropped from the table.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        labels = self.labels[rows]
+        used, new_labels = np.unique(labels, return_inverse=True)
+        return Gallery(
+            np.array(self.encodings[rows]),
+            new_labels.astype(np.int32),
+            [self.identities[label] for label in used],
+        )
+
+    def distances(self, face_encodings):
+        """Euclidean distances from each face encoding to every gallery row
+
+        Returns an (M, N) matrix for M query encodings.
+        """
+        queries = np.asarray(face_encodings, dtype=np.float64).reshape(-1, ENCODING_SIZE)
+        distances = np.empty((len(queries), len(self)))
+        for i, query in enumerate(queries):
+            distances[i] = np.linalg.norm(self.encodings - query, axis=1)
+        return distances
+
+    def match(self, face_encodings, tolerance):
+        """Identify each face encoding against the gallery
+
+        Returns a list of (name, student_id) tuples, with ("Unknown", None)
+        for faces that have no gallery row within tolerance.
+        """
+        results = [("Unknown", None)] * len(face_encodings)
+        if len(self) == 0 or len(face_encodings) == 0:
+            return results
+
+        distances = self.distances(face_encodings)
+        best_rows = np.argmin(distances, axis=1)
+        for i, row in enumerate(best_rows):
+            if distances[i, row] <= tolerance:
+                results[i] = self.identity(row)
+        return results
@@ -0,0 +1,546 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import threading
+import time
+import zlib
+import numpy as np
+from contextlib import contextmanager
+from pathlib import Path
+from .gallery import Gallery, ENCODING_SIZE
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+JOURNAL_MAGIC = b"GJR1"
+OP_ADD = 1
+OP_REMOVE = 2
+
+# One fixed-size journal record per enrolled face, or a tombstone that
+# removes every row of a student. The CRC covers every byte before it, so
+# a torn write at the end of the file is detected.
+JOURNAL_RECORD = np.dtype([
+    ("magic", "S4"),
+    ("op", "u1"),
+    ("pad", "V3"),
+    ("student_id", "S64"),
+    ("name", "S128"),
+    ("encoding", "<f4", (ENCODING_SIZE,)),
+    ("crc", "<u4"),
+])
+
+
+class GalleryStore:
+    """Versioned on-disk gallery format
+
+    A gallery is written as a generation directory holding:
+
+        encodings.npy    float32 (N, 128) matrix, loaded with mmap_mode='r'
+        labels.npy       int32 (N,) index into the identity table
+        identities.json  [[name, student_id], ...]
+        journal.bin      fixed-size records appended since the generation
+                         was written
+        manifest.jsonl   enrollment image path, size, mtime and SHA-1 ->
+                         gallery row, one JSON object per line
+
+    A small ``CURRENT`` file names the live generation. New generations are
+    written next to the old one and published by atomically replacing
+    ``CURRENT``, so a reader never sees a half-written gallery and loading
+    is a pair of memory maps regardless of gallery size.
+
+    Enrollment and removal only append to the journal, so their cost does
+    not grow with the gallery. Once the journal gets long, a background
+    compaction folds it into a new generation.
+    """
+
+    FORMAT_VERSION = 1
+    KEEP_GENERATIONS = 2
+
+    def __init__(self, directory, fsync="always", fsync_interval=5.0, compact_after=1000):
+        self.directory = Path(directory)
+        self.current_file = self.directory / "CURRENT"
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.compact_after = compact_after
+        self.logger = logging.getLogger("attendance_system")
+
+        self._lock = threading.RLock()
+        self._last_fsync = 0.0
+        self._compaction = None
+
+    def exists(self):
+        """Whether a published gallery is present"""
+        return self.current_file.exists()
+
+    def read_current(self):
+        """Return the metadata of the live generation"""
+        with open(self.current_file, 'r') as f:
+            meta = json.load(f)
+        if meta.get("version") != self.FORMAT_VERSION:
+            raise ValueError(f"Unsupported gallery format version {meta.get('version')}")
+        return meta
+
+    def journal_path(self, meta=None):
+        """Path of the live generation's journal"""
+        meta = meta or self.read_current()
+        return self.directory / meta["generation"] / "journal.bin"
+
+    def manifest_path(self, meta=None):
+        """Path of the live generation's image manifest"""
+        meta = meta or self.read_current()
+        return self.directory / meta["generation"] / "manifest.jsonl"
+
+    def read_manifest(self):
+        """Return the image manifest as a dict of path -> entry
+
+        Each entry has ``path``, ``size``, ``mtime_ns``, ``sha1`` and the
+        gallery ``row`` encoded from the image (None if no face was found).
+        Later lines override earlier ones for the same path.
+        """
+        with self._lock:
+            if not self.exists():
+                return {}
+            path = self.manifest_path()
+            if not path.exists():
+                return {}
+            with open(path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+
+        manifest = {}
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A torn final line from an interrupted append
+                continue
+            manifest[entry["path"]] = entry
+        return manifest
+
+    def write_manifest(self, manifest):
+        """Atomically replace the live generation's manifest"""
+        with self._lock:
+            path = self.manifest_path()
+            tmp_path = path.with_name(path.name + ".tmp")
+            self._write_manifest_file(tmp_path, manifest)
+            os.replace(tmp_path, path)
+
+    def _write_manifest_file(self, path, manifest):
+        """Write manifest entries to a file, one JSON object per line"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for entry in manifest.values():
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load(self):
+        """Load the live generation and replay its journal"""
+        return self.load_with_position()[0]
+
+    def load_with_position(self, end=None):
+        """Load the live generation and report how far it was read
+
+        Args:
+            end: Optional journal offset to stop reading at
+
+        Returns:
+            tuple: (gallery, (generation, journal offset in bytes))
+        """
+        with self._lock:
+            meta = self.read_current()
+            gallery = self._load_base(meta)
+            records = self._read_journal(self.journal_path(meta), end)
+        position = (meta["generation"], records.nbytes)
+        return self.replay(gallery, records), position
+
+    def position(self):
+        """Return (generation, journal size) of the gallery on disk
+
+        This only stats files, so it is cheap enough to poll.
+        """
+        meta = self.read_current()
+        journal = self.journal_path(meta)
+        size = journal.stat().st_size if journal.exists() else 0
+        return meta["generation"], size - size % JOURNAL_RECORD.itemsize
+
+    def read_journal_since(self, generation, offset, end=None):
+        """Read the valid journal records of a generation from a byte offset
+
+        Returns:
+            tuple: (records, offset just past the last valid record)
+        """
+        path = self.directory / generation / "journal.bin"
+        if not path.exists():
+            return np.empty(0, dtype=JOURNAL_RECORD), offset
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read() if end is None else f.read(end - offset)
+        records = self._validate_records(path, data)
+        return records, offset + records.nbytes
+
+    def _load_base(self, meta):
+        """Load a generation's base files as a memory-mapped Gallery"""
+        generation_dir = self.directory / meta["generation"]
+
+        encodings = np.load(generation_dir / "encodings.npy", mmap_mode='r', allow_pickle=False)
+        labels = np.load(generation_dir / "labels.npy", allow_pickle=False)
+        with open(generation_dir / "identities.json", 'r') as f:
+            identities = [tuple(identity) for identity in json.load(f)]
+
+        if encodings.shape != (meta["count"], ENCODING_SIZE):
+            raise ValueError(f"Gallery {meta['generation']} does not match its metadata")
+        return Gallery(encodings, labels, identities)
+
+    def replay(self, gallery, records):
+        """Apply journal records on top of a base gallery
+
+        Runs of additions are applied as one batch; each tombstone is applied
+        on its own, in file order, so rows end up exactly where the writer
+        put them.
+        """
+        if len(records) == 0:
+            return gallery
+        boundaries = np.flatnonzero(np.diff(records["op"])) + 1
+        for run in np.split(records, boundaries):
+            ids = [student_id.decode("utf-8") for student_id in run["student_id"]]
+            if run["op"][0] == OP_REMOVE:
+                for student_id in ids:
+                    gallery, _ = gallery.without_student(student_id)
+            else:
+                names = [name.decode("utf-8") for name in run["name"]]
+                gallery = gallery.extended(run["encoding"], names, ids)
+        return gallery
+
+    def _read_journal(self, path, limit=None):
+        """Read the valid records of a journal
+
+        Reading stops at the first record whose magic or CRC does not match,
+        which is where an interrupted append left off.
+        """
+        if not path.exists():
+            return np.empty(0, dtype=JOURNAL_RECORD)
+
+        with open(path, 'rb') as f:
+            data = f.read() if limit is None else f.read(limit)
+        return self._validate_records(path, data)
+
+    def _validate_records(self, path, data):
+        """Parse packed journal records, stopping at the first invalid one"""
+        count = len(data) // JOURNAL_RECORD.itemsize
+        records = np.frombuffer(data, dtype=JOURNAL_RECORD, count=count)
+
+        raw = memoryview(data)
+        for i in range(count):
+            start = i * JOURNAL_RECORD.itemsize
+            if not self._record_valid(raw[start:start + JOURNAL_RECORD.itemsize]):
+                self.logger.warning(f"Gallery journal {path} is damaged after record {i}, ignoring the rest")
+                return records[:i]
+        return records
+
+    @staticmethod
+    def _record_valid(raw):
+        """Check the magic and CRC of one packed journal record"""
+        body = raw[:JOURNAL_RECORD.itemsize - 4]
+        crc = int.from_bytes(raw[JOURNAL_RECORD.itemsize - 4:], "little")
+        return bytes(raw[:4]) == JOURNAL_MAGIC and zlib.crc32(body) == crc
+
+    def _valid_journal_size(self, f):
+        """Size of an open journal up to its last intact record
+
+        Appends only ever tear the final record, so that is the only one
+        that needs checking.
+        """
+        size = f.seek(0, os.SEEK_END)
+        size -= size % JOURNAL_RECORD.itemsize
+        if size:
+            f.seek(size - JOURNAL_RECORD.itemsize)
+            if not self._record_valid(f.read(JOURNAL_RECORD.itemsize)):
+                size -= JOURNAL_RECORD.itemsize
+        return size
+
+    def encode_additions(self, encodings, names, ids):
+        """Pack new gallery entries into journal records"""
+        records = np.zeros(len(encodings), dtype=JOURNAL_RECORD)
+        records["op"] = OP_ADD
+        records["encoding"] = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+        return self._seal_records(records, names, ids)
+
+    def encode_removals(self, ids):
+        """Pack tombstones that remove every row of the given students"""
+        records = np.zeros(len(ids), dtype=JOURNAL_RECORD)
+        records["op"] = OP_REMOVE
+        return self._seal_records(records, [""] * len(ids), ids)
+
+    def _seal_records(self, records, names, ids):
+        """Fill in the magic, names, IDs and CRC of packed records"""
+        records["magic"] = JOURNAL_MAGIC
+        for i, (name, student_id) in enumerate(zip(names, ids)):
+            name_bytes = name.encode("utf-8")
+            id_bytes = student_id.encode("utf-8")
+            if len(name_bytes) > JOURNAL_RECORD["name"].itemsize:
+                raise ValueError(f"Name is too long for the gallery: {name}")
+            if len(id_bytes) > JOURNAL_RECORD["student_id"].itemsize:
+                raise ValueError(f"Student ID is too long for the gallery: {student_id}")
+            records["name"][i] = name_bytes
+            records["student_id"][i] = id_bytes
+
+        body_size = JOURNAL_RECORD.itemsize - 4
+        raw = records.view(np.uint8).reshape(len(records), JOURNAL_RECORD.itemsize)
+        for i in range(len(records)):
+            records["crc"][i] = zlib.crc32(raw[i, :body_size].tobytes())
+        return records
+
+    @contextmanager
+    def transaction(self):
+        """Lock the live journal for a read-modify-append cycle
+
+        The caller brings its gallery up to the yielded transaction's
+        ``offset`` (other stations may have appended since it last looked),
+        works out the change and its new manifest rows, and writes both with
+        ``JournalTransaction.write``. Holding the lock throughout makes the
+        caller's view match file order, which removals depend on because
+        they move rows.
+
+        Yields:
+            JournalTransaction
+        """
+        with self._lock:
+            if not self.exists():
+                self.save(Gallery())
+            while True:
+                meta = self.read_current()
+                path = self.journal_path(meta)
+                path.touch()
+                with open(path, 'r+b') as f, self._file_lock(f):
+                    if self.read_current()["generation"] != meta["generation"]:
+                        # Compacted by another process while we waited for the lock
+                        continue
+
+                    # Drop a torn record left by a crash so new records stay aligned
+                    valid_size = self._valid_journal_size(f)
+                    if valid_size != f.seek(0, os.SEEK_END):
+                        self.logger.warning(f"Discarding an incomplete record at the end of {path}")
+                        f.truncate(valid_size)
+                    journal = JournalTransaction(self, meta, f, valid_size)
+                    yield journal
+                    break
+
+        if self.compact_after and journal.offset // JOURNAL_RECORD.itemsize >= self.compact_after:
+            self.compact_in_background()
+
+    @staticmethod
+    @contextmanager
+    def _file_lock(f):
+        """Hold an exclusive lock on an open file so stations sharing the
+        gallery directory do not interleave appends"""
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _sync(self, f):
+        """fsync a journal write according to the configured policy"""
+        now = time.monotonic()
+        if self.fsync == "always" or (self.fsync == "interval" and now - self._last_fsync >= self.fsync_interval):
+            os.fsync(f.fileno())
+            self._last_fsync = now
+
+    def save(self, gallery, manifest=None):
+        """Write a gallery as a new generation and publish it"""
+        with self._lock:
+            generation_dir, number = self._write_generation(gallery, manifest)
+            return self._publish(generation_dir, number, len(gallery))
+
+    def _write_generation(self, gallery, manifest=None):
+        """Write a gallery's base files into a new, unpublished generation"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        # Build the generation under a temporary name so a crash leaves no
+        # directory that looks complete. Creating it under the lock reserves
+        # the generation number.
+        with self._lock:
+            existing = list(self.directory.glob("gen-*")) + list(self.directory.glob(".gen-*.tmp"))
+            number = max([self._generation_number(path) for path in existing] + [0]) + 1
+            generation_dir = self.directory / f"gen-{number:06d}"
+            tmp_dir = self.directory / f".{generation_dir.name}.tmp"
+            tmp_dir.mkdir()
+        np.save(tmp_dir / "encodings.npy", np.asarray(gallery.encodings, dtype=np.float32))
+        np.save(tmp_dir / "labels.npy", np.asarray(gallery.labels, dtype=np.int32))
+        with open(tmp_dir / "identities.json", 'w') as f:
+            json.dump([list(identity) for identity in gallery.identities], f)
+        (tmp_dir / "journal.bin").touch()
+        self._write_manifest_file(tmp_dir / "manifest.jsonl", manifest or {})
+        os.replace(tmp_dir, generation_dir)
+        return generation_dir, number
+
+    def _publish(self, generation_dir, number, count):
+        """Point CURRENT at a generation and drop old ones"""
+        meta = {
+            "version": self.FORMAT_VERSION,
+            "generation": generation_dir.name,
+            "count": count,
+            "dim": ENCODING_SIZE,
+        }
+        self._write_json_atomic(self.current_file, meta)
+        self._remove_old_generations(number)
+        return meta
+
+    def compact(self):
+        """Fold the journal into a new generation
+
+        The base and journal are read under the lock, the new generation is
+        written without holding it, and any records appended in the meantime
+        are carried over to the new journal before it is published.
+        """
+        with self._lock:
+            if not self.exists():
+                return
+            meta = self.read_current()
+            journal = self.journal_path(meta)
+            journal_size = journal.stat().st_size if journal.exists() else 0
+            journal_size -= journal_size % JOURNAL_RECORD.itemsize
+            if journal_size == 0:
+                return
+            gallery = self.replay(self._load_base(meta), self._read_journal(journal, journal_size))
+
+        generation_dir, number = self._write_generation(gallery)
+
+        # Other processes append under the journal's file lock, so holding it
+        # while the tail is carried over means no record can be lost
+        with self._lock, open(journal, 'rb') as f, self._file_lock(f):
+            if self.read_current()["generation"] != meta["generation"]:
+                # A full save replaced the gallery while we were compacting
+                shutil.rmtree(generation_dir, ignore_errors=True)
+                return
+
+            # Rows keep their positions, so the manifest carries over as is
+            manifest = self.manifest_path(meta)
+            if manifest.exists():
+                shutil.copyfile(manifest, generation_dir / "manifest.jsonl")
+
+            f.seek(journal_size)
+            tail = f.read()
+            tail = tail[:len(tail) - len(tail) % JOURNAL_RECORD.itemsize]
+            if tail:
+                with open(generation_dir / "journal.bin", 'ab') as new_journal:
+                    new_journal.write(tail)
+                    new_journal.flush()
+                    os.fsync(new_journal.fileno())
+            self._publish(generation_dir, number, len(gallery))
+
+        self.logger.info(f"Compacted gallery journal into {generation_dir.name} ({len(gallery)} faces)")
+
+    def compact_in_background(self):
+        """Start a compaction thread unless one is already running"""
+        with self._lock:
+            if self._compaction is not None and self._compaction.is_alive():
+                return
+            self._compaction = threading.Thread(target=self._run_compaction, name="gallery-compaction", daemon=True)
+            self._compaction.start()
+
+    def _run_compaction(self):
+        """Compaction thread body"""
+        try:
+            self.compact()
+        except Exception as e:
+            self.logger.error(f"Error compacting gallery: {e}")
+
+    def migrate_pickle(self, pickle_file):
+        """Convert a legacy encodings.pkl into the binary format
+
+        The pickle is kept as ``encodings.pkl.migrated`` for reference.
+        """
+        pickle_file = Path(pickle_file)
+        with open(pickle_file, 'rb') as f:
+            data = pickle.load(f)
+        gallery = Gallery.from_lists(data['encodings'], data['names'], data['ids'])
+
+        self.save(gallery)
+        pickle_file.rename(pickle_file.with_name(pickle_file.name + ".migrated"))
+        self.logger.info(f"Migrated {len(gallery)} face encodings from {pickle_file.name}")
+        return self.load()
+
+    @staticmethod
+    def file_digest(path):
+        """SHA-1 of a file's contents, as used in the manifest"""
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _write_json_atomic(self, path, data):
+        """Write JSON to a temporary file, fsync it and rename it into place"""
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _generation_number(path):
+        """Generation number from a gen-NNNNNN directory name, or 0"""
+        try:
+            return int(path.name.split("-")[1].split(".")[0])
+        except (IndexError, ValueError):
+            return 0
+
+    def _remove_old_generations(self, current):
+        """Delete generations older than the ones we keep for lagging readers
+
+        Temporary directories from earlier generations are leftovers of an
+        interrupted write and are removed as well.
+        """
+        for path in self.directory.glob("gen-*"):
+            if self._generation_number(path) <= current - self.KEEP_GENERATIONS:
+                shutil.rmtree(path, ignore_errors=True)
+        for path in self.directory.glob(".gen-*.tmp"):
+            if self._generation_number(path) < current:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+class JournalTransaction:
+    """An open, locked journal handed out by ``GalleryStore.transaction``
+
+    ``offset`` is the end of the valid records; everything before it is
+    what the caller has to have applied before writing.
+    """
+
+    def __init__(self, store, meta, f, offset):
+        self.store = store
+        self.meta = meta
+        self.generation = meta["generation"]
+        self.offset = offset
+        self._file = f
+
+    def write(self, records, manifest_entries=()):
+        """Append records and the manifest lines for the rows they touch
+
+        Records go out in a single write call and are synced according to
+        the store's fsync policy.
+
+        Args:
+            records: Packed records from encode_additions/encode_removals
+            manifest_entries: Manifest entries, each with its final ``row``
+        """
+        self._file.seek(self.offset)
+        self._file.write(records.tobytes())
+        self._file.flush()
+        self.store._sync(self._file)
+        self.offset += records.nbytes
+
+        if manifest_entries:
+            with open(self.store.manifest_path(self.meta), 'a', encoding='utf-8') as manifest:
+                for entry in manifest_entries:
+                    manifest.write(json.dumps(entry) + "\n")
+                manifest.flush()
+                self.store._sync(manifest)
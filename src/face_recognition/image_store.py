@@ -0,0 +1,302 @@
+import cv2
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import numpy as np
+from pathlib import Path
+
+
+class ImageStore:
+    """Content-addressed store for enrollment images
+
+    Images are keyed by the SHA-1 of their encoded bytes, so the same photo
+    is only ever stored once:
+
+        originals/ab/<sha1>        full-resolution image, as captured
+        working/ab/<sha1>.jpg      copy downscaled to ``working_size``,
+                                   which is what gets encoded
+        packs/pack-NNNNNN.pack     cold originals packed into one file
+        packs/pack-NNNNNN.idx      sha1 -> [offset, length] in the pack
+
+    Writes go through a background thread, so enrolling a face never waits
+    on the disk; ``flush`` waits for everything queued so far.
+    """
+
+    def __init__(self, directory, working_size=800, jpeg_quality=95, asynchronous=True):
+        self.directory = Path(directory)
+        self.originals_dir = self.directory / "originals"
+        self.working_dir = self.directory / "working"
+        self.packs_dir = self.directory / "packs"
+        self.working_size = working_size
+        self.jpeg_quality = jpeg_quality
+        self.asynchronous = asynchronous
+        self.logger = logging.getLogger("attendance_system")
+
+        self._lock = threading.Lock()
+        self._pending = {}  # digest -> original bytes not written yet
+        self._packs = None  # digest -> (pack path, offset, length), loaded on first use
+        self._queue = queue.Queue()
+        self._thread = None
+
+    @staticmethod
+    def digest(data):
+        """SHA-1 of an encoded image"""
+        return hashlib.sha1(data).hexdigest()
+
+    def original_path(self, digest):
+        """Path of a loose original"""
+        return self.originals_dir / digest[:2] / digest
+
+    def working_path(self, digest):
+        """Path of a working copy"""
+        return self.working_dir / digest[:2] / f"{digest}.jpg"
+
+    def working_copy(self, image):
+        """Downscale an image so its longer side is at most ``working_size``"""
+        height, width = image.shape[:2]
+        scale = self.working_size / max(height, width)
+        if scale >= 1:
+            return image
+        return cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+
+    def encode_image(self, image):
+        """Encode a BGR image as the JPEG that put_image would store
+
+        Returns:
+            tuple: (digest, JPEG bytes)
+        """
+        ok, data = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise ValueError("Could not encode the image")
+        data = data.tobytes()
+        return self.digest(data), data
+
+    def put_image(self, image, working=None):
+        """Store a BGR image as a JPEG
+
+        Returns:
+            str: The image's digest
+        """
+        _, data = self.encode_image(image)
+        return self.put(data, image, working)
+
+    def put(self, data, image=None, working=None):
+        """Store an encoded image and its working copy
+
+        Args:
+            data: Encoded image bytes, stored as is
+            image: The decoded image, if the caller has it
+            working: The working copy, if the caller has made it
+
+        Returns:
+            str: The image's digest
+        """
+        digest = self.digest(data)
+        if self.has(digest):
+            return digest
+
+        if working is None:
+            if image is None:
+                image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            working = self.working_copy(image)
+        ok, working_data = cv2.imencode(".jpg", working, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise ValueError("Could not encode the working copy")
+
+        with self._lock:
+            self._pending[digest] = data
+        self.submit(self._write, digest, data, working_data.tobytes())
+        return digest
+
+    def _write(self, digest, data, working_data):
+        """Write an original and its working copy"""
+        try:
+            self._write_file(self.original_path(digest), data)
+            self._write_file(self.working_path(digest), working_data)
+        finally:
+            with self._lock:
+                self._pending.pop(digest, None)
+
+    @staticmethod
+    def _write_file(path, data):
+        """Write to a temporary file and rename it into place"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def submit(self, function, *args):
+        """Run a disk write on the writer thread, or inline if not asynchronous"""
+        if not self.asynchronous:
+            function(*args)
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="image-store-writer", daemon=True)
+                self._thread.start()
+        self._queue.put((function, args))
+
+    def _run(self):
+        """Writer thread loop"""
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                function, args = job
+                function(*args)
+            except Exception as e:
+                self.logger.error(f"Error writing to the image store: {e}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Wait until every queued write is on disk"""
+        self._queue.join()
+
+    def close(self):
+        """Finish queued writes and stop the writer thread"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def has(self, digest):
+        """Whether an image is stored (or queued to be)"""
+        with self._lock:
+            if digest in self._pending:
+                return True
+        return self.original_path(digest).exists() or digest in self._pack_index()
+
+    def get(self, digest):
+        """Return the original bytes of an image, or None"""
+        with self._lock:
+            data = self._pending.get(digest)
+        if data is not None:
+            return data
+
+        path = self.original_path(digest)
+        if path.exists():
+            return path.read_bytes()
+
+        location = self._pack_index().get(digest)
+        if location is None:
+            return None
+        pack, offset, length = location
+        with open(pack, 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def get_working(self, digest):
+        """Return the working copy of an image as a BGR array, or None"""
+        path = self.working_path(digest)
+        if path.exists():
+            image = cv2.imread(str(path))
+            if image is not None:
+                return image
+
+        data = self.get(digest)
+        if data is None:
+            return None
+        return self.working_copy(cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR))
+
+    def discard(self, digest):
+        """Delete an image
+
+        Loose files are removed and packed copies are dropped from their
+        pack's index; the packed bytes stay in the pack file.
+        """
+        self.original_path(digest).unlink(missing_ok=True)
+        self.working_path(digest).unlink(missing_ok=True)
+
+        location = self._pack_index().get(digest)
+        if location is None:
+            return
+        pack = location[0]
+        index_path = pack.with_suffix(".idx")
+        with self._lock:
+            with open(index_path, 'r') as f:
+                index = json.load(f)
+            index.pop(digest, None)
+            self._write_index(index_path, index)
+            self._packs.pop(digest, None)
+
+    def _pack_index(self):
+        """Return digest -> (pack, offset, length) for every packed image"""
+        with self._lock:
+            if self._packs is None:
+                packs = {}
+                for index_path in sorted(self.packs_dir.glob("pack-*.idx")):
+                    with open(index_path, 'r') as f:
+                        for digest, (offset, length) in json.load(f).items():
+                            packs[digest] = (index_path.with_suffix(".pack"), offset, length)
+                self._packs = packs
+            return self._packs
+
+    def _write_index(self, path, index):
+        """Atomically write a pack index"""
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def pack_cold(self, older_than_days=30):
+        """Move originals not touched for a while into a new pack file
+
+        The pack and its index are fsynced and published before the loose
+        files are removed, so an interruption never loses an image.
+
+        Returns:
+            int: Number of originals packed
+        """
+        cutoff = time.time() - older_than_days * 86400
+        loose = [
+            path for path in self.originals_dir.glob("*/*")
+            if path.is_file() and not path.name.startswith(".") and path.stat().st_mtime < cutoff
+        ]
+        if not loose:
+            return 0
+
+        self.packs_dir.mkdir(parents=True, exist_ok=True)
+        numbers = [int(path.stem.split("-")[1]) for path in self.packs_dir.glob("pack-*.idx")]
+        pack = self.packs_dir / f"pack-{max(numbers + [0]) + 1:06d}.pack"
+        tmp_pack = pack.with_name(f".{pack.name}.tmp")
+
+        index = {}
+        with open(tmp_pack, 'wb') as f:
+            for path in loose:
+                data = path.read_bytes()
+                index[path.name] = [f.tell(), len(data)]
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_pack, pack)
+        self._write_index(pack.with_suffix(".idx"), index)
+
+        self._pack_index()
+        with self._lock:
+            for digest, (offset, length) in index.items():
+                self._packs[digest] = (pack, offset, length)
+        for path in loose:
+            path.unlink(missing_ok=True)
+
+        self.logger.info(f"Packed {len(loose)} cold image(s) into {pack.name}")
+        return len(loose)
+
+    def stats(self):
+        """Return counts of loose, working and packed images"""
+        return {
+            "loose": sum(1 for path in self.originals_dir.glob("*/*") if not path.name.startswith(".")),
+            "working": sum(1 for path in self.working_dir.glob("*/*") if not path.name.startswith(".")),
+            "packed": len(self._pack_index()),
+            "packs": len(list(self.packs_dir.glob("pack-*.pack"))),
+        }
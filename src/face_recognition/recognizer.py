@@ -1,135 +1,885 @@
 import cv2
-import face_recognition
 import numpy as np
 import os
 import logging
-import pickle
+import threading
+import time
+from collections import namedtuple
 from pathlib import Path
-from datetime import datetime
 from ..utils.config import Config
+from ..utils.frame_buffers import FrameBufferPool
+from ..database.db_manager import DatabaseManager
+from .gallery import Gallery
+from .gallery_store import GalleryStore, OP_REMOVE
+from .duplicates import find_conflicts, DEFAULT_BLOCK_SIZE
+from .chips import ChipCache, encode_with_chip
+from .image_store import ImageStore
+
+# An encoded enrollment image, written to the image store only once its face is enrolled
+PendingImage = namedtuple("PendingImage", ["digest", "data", "working", "chip"])
 
 class FaceRecognizer:
     """Handle face recognition operations"""
     
-    def __init__(self):
+    def __init__(self, db=None):
         self.config = Config()
         self.logger = logging.getLogger("attendance_system")
-        self.known_face_encodings = []
-        self.known_face_names = []
-        self.known_face_ids = []
+        
+        # The gallery is an immutable snapshot that is swapped on every change.
+        # Readers take a reference without locking; writers serialize on the lock.
+        self.gallery = Gallery()
+        self._gallery_lock = threading.RLock()
+        gallery_settings = self.config.get("gallery")
+        self.store = GalleryStore(
+            self.config.get("paths", "gallery_dir", default="data/known_faces/gallery"),
+            fsync=gallery_settings.get("fsync", "always"),
+            fsync_interval=gallery_settings.get("fsync_interval", 5.0),
+            compact_after=gallery_settings.get("compact_after", 1000),
+        )
+        
+        # Where the gallery is persisted: "files" (GalleryStore) or "sqlite"
+        # (the encodings table, shared with the students it belongs to)
+        self.backend = gallery_settings.get("backend", "files")
+        self.db = db
+        if self.backend == "sqlite" and self.db is None:
+            self.db = DatabaseManager()
+        self._db_watermark = 0
+        self._db_tombstone_mark = 0
+        
+        # (generation, journal offset) of the store that self.gallery reflects
+        self._position = None
+        self.watch_interval = gallery_settings.get("watch_interval", 2.0)
+        
+        # What to do when a new face matches a different student: "off", "warn" or "reject"
+        self.duplicate_check = gallery_settings.get("duplicate_check", "warn")
+        self.duplicate_block_size = gallery_settings.get("duplicate_block_size", DEFAULT_BLOCK_SIZE)
+        self._watch_stop = threading.Event()
+        self._watch_thread = None
+        
         self.face_locations = []
         self.face_encodings = []
         self.face_names = []
         self.process_current_frame = True
         
+        # Reusable resize/convert targets for process_frame
+        self.buffers = FrameBufferPool()
+        
         # Load recognition settings
         self.tolerance = self.config.get("recognition", "tolerance")
         self.frame_reduction = self.config.get("recognition", "frame_reduction")
         self.model = self.config.get("recognition", "model")
+        self.landmark_model = self.config.get("recognition", "landmark_model", default="small")
+        self.num_jitters = gallery_settings.get("num_jitters", 1)
+        
+        # Aligned face chips of enrollment photos, for re-encoding without detection
+        self.chips = ChipCache(self.config.get("paths", "chip_dir", default="data/face_chips"))
+        
+        # Captured enrollment images, stored once per content hash
+        image_settings = self.config.get("image_store")
+        self.image_store = ImageStore(
+            self.config.get("paths", "image_store_dir", default="data/image_store"),
+            working_size=image_settings.get("working_size", 800),
+            jpeg_quality=image_settings.get("jpeg_quality", 95),
+        )
         
         # Load known faces
         self.load_known_faces()
     
+    @property
+    def known_face_encodings(self):
+        return list(self.gallery.encodings)
+    
+    @property
+    def known_face_names(self):
+        return self.gallery.names
+    
+    @property
+    def known_face_ids(self):
+        return self.gallery.ids
+    
     def load_known_faces(self):
-        """Load known faces from the database or encodings file"""
+        """Load known faces from the gallery store or encodings file"""
         known_faces_dir = Path(self.config.get("paths", "known_faces_dir"))
         encoding_file = known_faces_dir / "encodings.pkl"
+        sync_images = self.config.get("gallery", "sync_on_startup", default=True)
         
-        if encoding_file.exists():
-            self.logger.info("Loading pre-computed face encodings")
-            with open(encoding_file, 'rb') as f:
-                data = pickle.load(f)
-                self.known_face_encodings = data['encodings']
-                self.known_face_names = data['names']
-                self.known_face_ids = data['ids']
-            self.logger.info(f"Loaded {len(self.known_face_encodings)} face encodings")
+        if self.backend == "sqlite":
+            self._load_from_database(encoding_file)
             return
-            
-        # If no encoding file, then process all images in the directory
-        self.logger.info("Processing face images to create encodings")
-        known_faces_dir.mkdir(parents=True, exist_ok=True)
         
+        if self.store.exists():
+            self.logger.info("Loading pre-computed face encodings")
+            self.gallery, self._position = self.store.load_with_position()
+            self.logger.info(f"Loaded {len(self.gallery)} face encodings")
+        elif encoding_file.exists():
+            # One-time conversion of the legacy pickle to the binary gallery
+            self.logger.info("Migrating encodings.pkl to the binary gallery format")
+            self.store.migrate_pickle(encoding_file)
+            self.gallery, self._position = self.store.load_with_position()
+            self.logger.info(f"Loaded {len(self.gallery)} face encodings")
+        else:
+            # If no encodings at all, then process all images in the directory
+            self.logger.info("Processing face images to create encodings")
+            known_faces_dir.mkdir(parents=True, exist_ok=True)
+            sync_images = True
+        
+        if sync_images:
+            self.sync_with_images()
+    
+    def _load_from_database(self, encoding_file):
+        """Load the gallery from the encodings table in one bulk query"""
+        if self.db.get_meta("gallery_imported") is None and (self.store.exists() or encoding_file.exists()):
+            # One-time import of an existing file gallery into the database
+            if not self.store.exists():
+                self.store.migrate_pickle(encoding_file)
+            gallery = self.store.load()
+            imported = self.db.import_gallery(gallery.identities, zip(gallery.ids, gallery.encodings))
+            if imported is not None:
+                self.logger.info(f"Imported {imported} face encodings into the database")
+        
+        # Tombstones first, so a removal racing with this load is seen again
+        _, self._db_tombstone_mark = self.db.load_tombstones()
+        encodings, names, ids, self._db_watermark = self.db.load_encodings()
+        self.gallery = Gallery.from_lists(encodings, names, ids)
+        self.logger.info(f"Loaded {len(self.gallery)} face encodings from the database")
+    
+    def _enrollment_images(self):
+        """Yield every enrollment photo under the known faces directory"""
+        known_faces_dir = Path(self.config.get("paths", "known_faces_dir"))
         for student_dir in known_faces_dir.glob("*"):
-            if not student_dir.is_dir():
+            if not student_dir.is_dir() or student_dir.resolve() == self.store.directory.resolve():
                 continue
-                
-            name = student_dir.name
-            student_id = student_dir.name  # Assuming directory name is the student ID
-            
             for image_file in student_dir.glob("*.jpg"):
-                try:
-                    image = face_recognition.load_image_file(image_file)
-                    encoding = face_recognition.face_encodings(image)
-                    
-                    if len(encoding) > 0:
-                        self.known_face_encodings.append(encoding[0])
-                        self.known_face_names.append(name)
-                        self.known_face_ids.append(student_id)
+                yield known_faces_dir, image_file
+    
+    def _scan_images(self, gallery, manifest, digests):
+        """Compare the enrollment photos on disk with the store's manifest
+        
+        Args:
+            gallery: Gallery the manifest rows refer to
+            manifest: Image manifest, as read from the store
+            digests: Dict of (path, size, mtime_ns) -> SHA-1, filled in as
+                photos are hashed so a second scan does not hash them again
+            
+        Returns:
+            tuple: (manifest entries to keep, [(image_file, source, student_id)]
+                to encode, set of gallery rows to drop)
+        """
+        # A gallery without a manifest (e.g. migrated from encodings.pkl)
+        # already covers the photos of students it knows about
+        adopt = not manifest and len(gallery) > 0
+        known_ids = {student_id for _, student_id in gallery.identities}
+        
+        # Images in the image store are not part of the directory scan
+        entries = {
+            path: entry for path, entry in manifest.items()
+            if entry.get("store") and (entry["row"] is None or entry["row"] < len(gallery))
+        }
+        new_images = []
+        dropped_rows = set()
+        for known_faces_dir, image_file in self._enrollment_images():
+            path = image_file.relative_to(known_faces_dir).as_posix()
+            stat = image_file.stat()
+            entry = manifest.get(path)
+            if entry and entry["row"] is not None and entry["row"] >= len(gallery):
+                # Points past the gallery, e.g. the journal write was lost
+                entry = None
+            if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                entries[path] = entry
+                continue
+            
+            key = (path, stat.st_size, stat.st_mtime_ns)
+            if key not in digests:
+                digests[key] = self.store.file_digest(image_file)
+            source = {
+                "path": path,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha1": digests[key],
+            }
+            student_id = image_file.parent.name
+            if entry and entry["sha1"] == source["sha1"]:
+                entries[path] = dict(source, row=entry["row"])
+            elif entry is None and adopt and student_id in known_ids:
+                entries[path] = dict(source, row=None)
+            else:
+                if entry and entry["row"] is not None:
+                    dropped_rows.add(entry["row"])
+                new_images.append((image_file, source, student_id))
+        
+        for path, entry in manifest.items():
+            if path not in entries and entry["row"] is not None:
+                dropped_rows.add(entry["row"])
+        return entries, new_images, dropped_rows
+    
+    def _encode_images(self, images, encoded, failed):
+        """Encode enrollment photos and save their chips
+        
+        Args:
+            images: (image_file, source, student_id) tuples
+            encoded: Dict of SHA-1 -> encoding, or None if no face was found;
+                photos already in it are skipped
+            failed: Set of SHA-1s of photos that could not be read
+        """
+        import face_recognition
+        for image_file, source, _ in images:
+            digest = source["sha1"]
+            if digest in encoded or digest in failed:
+                continue
+            try:
+                image = face_recognition.load_image_file(image_file)
+                encoding, chip = encode_with_chip(image, self.landmark_model, self.num_jitters)
+                if chip is not None:
+                    self.chips.save(digest, chip)
+            except Exception as e:
+                self.logger.error(f"Error processing {image_file}: {e}")
+                failed.add(digest)
+                continue
+            encoded[digest] = encoding
+    
+    def sync_with_images(self):
+        """Bring the gallery in line with the enrollment photos on disk
+        
+        The store's manifest records the size, mtime and SHA-1 of every photo
+        and the gallery row encoded from it. Photos whose size and mtime are
+        unchanged are trusted, changed ones are re-hashed, and only new or
+        modified photos are encoded. Rows for deleted photos are dropped.
+        
+        Photos are found and encoded without holding the gallery lock, so
+        enrollment and hot reload carry on during a long rescan. The lock,
+        and the journal's file lock, are only taken to scan again against
+        the current manifest, which is cheap once the photos are hashed,
+        and to publish the result.
+        
+        Returns:
+            tuple: (added, removed) number of gallery rows
+        """
+        if self.backend != "files":
+            self.logger.info("Photo sync is only available with the files gallery backend")
+            return 0, 0
+        
+        digests = {}
+        encoded = {}
+        failed = set()
+        self.reload_changes()
+        manifest = self.store.read_manifest()
+        entries, new_images, dropped_rows = self._scan_images(self.gallery, manifest, digests)
+        if not new_images and not dropped_rows and entries == manifest:
+            return 0, 0
+        
+        while True:
+            # Encode only the new and changed photos
+            self._encode_images(new_images, encoded, failed)
+            
+            # The journal stays locked until the new generation is published,
+            # so records other stations append meanwhile are not lost
+            with self._gallery_lock, self.store.transaction() as journal:
+                self._catch_up(journal)
+                gallery = self.gallery
+                manifest = self.store.read_manifest()
+                entries, new_images, dropped_rows = self._scan_images(gallery, manifest, digests)
+                if any(source["sha1"] not in encoded and source["sha1"] not in failed
+                       for _, source, _ in new_images):
+                    # Photos were added or changed while we were encoding
+                    continue
+                removed = len(dropped_rows)
+                
+                if not new_images and not dropped_rows:
+                    # Nothing to encode; just record refreshed stats or adopted photos
+                    if entries != manifest:
+                        self.store.write_manifest(entries)
+                    return 0, 0
+                
+                known_names = {student_id: name for name, student_id in gallery.identities}
+                encodings, names, ids, sources = [], [], [], []
+                for image_file, source, student_id in new_images:
+                    if source["sha1"] in failed:
+                        continue
+                    encoding = encoded[source["sha1"]]
+                    name = known_names.get(student_id, student_id)  # Directory name is the student ID
+                    if encoding is not None:
+                        encodings.append(encoding)
+                        names.append(name)
+                        ids.append(student_id)
+                        sources.append(source)
                         self.logger.info(f"Added encoding for {name} ({student_id})")
                     else:
+                        # Remember the photo so it is not retried on every sync
+                        entries[source["path"]] = dict(source, row=None)
                         self.logger.warning(f"No face found in {image_file}")
-                        
-                except Exception as e:
-                    self.logger.error(f"Error processing {image_file}: {e}")
-        
-        # Save encodings if any were created
-        if self.known_face_encodings:
-            data = {
-                'encodings': self.known_face_encodings,
-                'names': self.known_face_names,
-                'ids': self.known_face_ids
-            }
-            with open(encoding_file, 'wb') as f:
-                pickle.dump(data, f)
-            self.logger.info(f"Saved {len(self.known_face_encodings)} face encodings")
+                
+                # Keep surviving rows in order and renumber their manifest entries
+                kept_rows = [row for row in range(len(gallery)) if row not in dropped_rows]
+                new_row = {old: new for new, old in enumerate(kept_rows)}
+                for path, entry in entries.items():
+                    if entry["row"] is not None:
+                        entries[path] = dict(entry, row=new_row[entry["row"]])
+                for i, source in enumerate(sources):
+                    entries[source["path"]] = dict(source, row=len(kept_rows) + i)
+                
+                # Publish the result as a single snapshot and generation
+                gallery = gallery.subset(kept_rows).extended(encodings, names, ids)
+                meta = self.store.save(gallery, entries)
+                self.gallery = gallery
+                self._position = (meta["generation"], 0)
+                break
+        
+        self.logger.info(f"Gallery synced with photos: {len(encodings)} added, {removed} removed, "
+                         f"{len(gallery)} face encodings")
+        return len(encodings), removed
+    
+    def _encode_face(self, image, name, student_id):
+        """Encode an enrollment image
+        
+        The face is encoded from the downscaled working copy. Nothing is
+        written yet: once the face is accepted, store_images puts the image
+        and its chip in the image store, so a rejected enrollment leaves no
+        files behind.
+        
+        Returns:
+            tuple: (encoding, manifest source, PendingImage) or
+                (None, None, None) if no face was found
+        """
+        # Get face encoding, keeping the aligned chip it was computed from
+        working = self.image_store.working_copy(image)
+        rgb_image = cv2.cvtColor(working, cv2.COLOR_BGR2RGB)
+        encoding, chip = encode_with_chip(rgb_image, self.landmark_model, self.num_jitters)
+        
+        if encoding is None:
+            self.logger.warning(f"No face found in the image for {name}")
+            return None, None, None
+        
+        digest, data = self.image_store.encode_image(image)
+        source = self.store_source(digest, student_id)
+        return encoding, source, PendingImage(digest, data, working, chip)
+    
+    def store_images(self, pending):
+        """Put accepted enrollment images and their chips in the image store
+        
+        The disk writes happen on the image store's writer thread.
+        
+        Args:
+            pending: PendingImage for each accepted face (None entries are skipped)
+        """
+        for image in pending:
+            if image is None:
+                continue
+            self.image_store.put(image.data, working=image.working)
+            self.image_store.submit(self.chips.save, image.digest, image.chip)
+    
+    def _discard_images(self, digests):
+        """Delete images and chips that no face uses any more"""
+        for digest in digests:
+            self.image_store.discard(digest)
+            self.chips.discard(digest)
+    
+    @staticmethod
+    def store_source(digest, student_id):
+        """Manifest entry (without ``row``) for an image in the image store
+        
+        Photo sync leaves these entries alone; they only change when the
+        student is removed or re-enrolled. The same image may be enrolled
+        for more than one student, so the path names both.
+        """
+        return {"path": f"store:{digest}/{student_id}", "store": True, "student_id": student_id,
+                "size": None, "mtime_ns": None, "sha1": digest}
     
     def add_face(self, image, name, student_id):
         """Add a new face to the known faces"""
+        return self.add_faces([(image, name, student_id)])[0]
+    
+    def encode_faces(self, entries):
+        """Encode enrollment images without touching the gallery or the image store
+        
+        Args:
+            entries: Iterable of (image, name, student_id) tuples
+            
+        Returns:
+            list: (encoding, manifest source, PendingImage) for each entry,
+                (None, None, None) where no face was found; pass the
+                PendingImage of each accepted face to store_images
+        """
+        results = []
+        for image, name, student_id in entries:
+            try:
+                results.append(self._encode_face(image, name, student_id))
+            except Exception as e:
+                self.logger.error(f"Error adding face: {e}")
+                results.append((None, None, None))
+        return results
+    
+    def add_faces(self, entries):
+        """Add several faces to the known faces in one gallery update
+        
+        Args:
+            entries: Iterable of (image, name, student_id) tuples
+            
+        Returns:
+            list: True/False for each entry, in order
+        """
+        return [success for success, _ in self.add_faces_with_errors(entries)]
+    
+    def _enrolled_images(self, ids):
+        """Return the (image SHA-1, student_id) pairs already enrolled for some students"""
+        if self.backend == "sqlite":
+            return {(digest, student_id) for student_id in set(ids) for digest in self.db.student_images(student_id)}
+        return {
+            (entry["sha1"], entry["student_id"]) for entry in self.store.read_manifest().values()
+            if entry.get("store") and entry["row"] is not None
+        }
+    
+    def add_faces_with_errors(self, entries):
+        """Add several faces in one gallery update, saying why any were not added
+        
+        Args:
+            entries: Iterable of (image, name, student_id) tuples
+            
+        Returns:
+            list: (success, error message or None) for each entry, in order
+        """
+        entries = list(entries)
+        encoded = self.encode_faces(entries)
+        results = [(True, None) if encoding is not None else (False, "No face found in the photo")
+                   for encoding, _, _ in encoded]
+        
+        indices = [i for i, (encoding, _, _) in enumerate(encoded) if encoding is not None]
+        conflicts = self.find_duplicates([encoded[i][0] for i in indices],
+                                         [entries[i][1] for i in indices],
+                                         [entries[i][2] for i in indices])
+        if self.duplicate_check == "reject":
+            # Faces that already belong to another student are not enrolled
+            for i, conflict in zip(list(indices), conflicts):
+                if conflict is not None:
+                    results[i] = (False, f"This face is already enrolled as {conflict[0]} ({conflict[1]})")
+                    indices.remove(i)
+
+        # An image that is already enrolled for the student, or appears twice
+        # for them in the batch, is only added once
+        seen = self._enrolled_images(entries[i][2] for i in indices)
+        for i in list(indices):
+            key = (encoded[i][1]["sha1"], entries[i][2])
+            if key in seen:
+                results[i] = (False, f"This photo is already enrolled for {entries[i][2]}")
+                indices.remove(i)
+            seen.add(key)
+
+        encodings = [encoded[i][0] for i in indices]
+        sources = [encoded[i][1] for i in indices]
+        names = [entries[i][1] for i in indices]
+        ids = [entries[i][2] for i in indices]
+        
+        if not encodings:
+            return results
+        
         try:
-            known_faces_dir = Path(self.config.get("paths", "known_faces_dir"))
-            student_dir = known_faces_dir / student_id
-            student_dir.mkdir(parents=True, exist_ok=True)
+            if self.db is not None:
+                # Students are registered with either backend so their attendance
+                # can be marked; the encodings table only backs the sqlite gallery
+                faces = None
+                if self.backend == "sqlite":
+                    faces = zip(ids, encodings, [source["sha1"] for source in sources])
+                self.db.register_students(set(zip(names, ids)), faces)
+            self.add_encodings(encodings, names, ids, sources)
+        except Exception as e:
+            self.logger.error(f"Error adding face: {e}")
+            return [(False, str(e))] * len(results)
+        self.store_images(encoded[i][2] for i in indices)
+        
+        for name, student_id in zip(names, ids):
+            self.logger.info(f"Added new face for {name} ({student_id})")
+        return results
+    
+    def find_duplicates(self, encodings, names, ids):
+        """Check new face encodings against the other students in the gallery
+        
+        One blocked matrix product against the gallery, so it is cheap enough
+        to run on every enrollment. The new faces are also checked against
+        each other, so one batch cannot enroll the same face under two IDs.
+        Matches are logged as warnings.
+        
+        Returns:
+            list: For each encoding, (name, student_id, distance) of the
+                closest different student within tolerance, or None
+        """
+        if self.duplicate_check == "off":
+            return [None] * len(encodings)
+        conflicts = find_conflicts(self.gallery, encodings, ids, self.tolerance,
+                                   self.duplicate_block_size, names=names)
+        for name, student_id, conflict in zip(names, ids, conflicts):
+            if conflict is not None:
+                self.logger.warning(f"Face for {name} ({student_id}) matches {conflict[0]} ({conflict[1]}), "
+                                    f"who is already enrolled or in the same batch (distance {conflict[2]:.3f})")
+        return conflicts
+    
+    def add_encodings(self, encodings, names, ids, sources=None):
+        """Add precomputed face encodings to the gallery in one update
+        
+        Small batches are appended to the store's journal. A batch at least
+        as large as the compaction threshold is written straight out as a new
+        generation instead, so bulk enrollment costs one sequential write.
+        
+        With the sqlite backend the encodings table is the gallery: the rows
+        must already have been written with the student's registration and
+        are picked up through the rowid watermark.
+        
+        Args:
+            encodings: Face encodings to add
+            names: Name for each encoding
+            ids: Student ID for each encoding
+            sources: Optional manifest entry for the photo of each encoding
+        """
+        with self._gallery_lock:
+            if self.backend == "sqlite":
+                self.reload_changes()
+                return
             
-            # Save the image
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            image_file = student_dir / f"{timestamp}.jpg"
-            cv2.imwrite(str(image_file), image)
+            # Either way the journal stays locked until the change is on disk,
+            # so records other stations append meanwhile are not lost
+            bulk = self.store.compact_after and len(encodings) >= self.store.compact_after
+            records = None if bulk else self.store.encode_additions(encodings, names, ids)
+            with self.store.transaction() as journal:
+                self._catch_up(journal)
+                first_row = len(self.gallery)
+                gallery = self.gallery.extended(encodings, names, ids)
+                
+                if bulk:
+                    manifest = self.store.read_manifest()
+                    for row, source in enumerate(sources or [], start=first_row):
+                        if source is not None:
+                            manifest[source["path"]] = dict(source, row=row)
+                    meta = self.store.save(gallery, manifest)
+                    self.gallery = gallery
+                    self._position = (meta["generation"], 0)
+                    return
+                
+                # Only the new entries are written, as journal records
+                entries = [dict(source, row=first_row + i) for i, source in enumerate(sources or [])
+                           if source is not None]
+                journal.write(records, entries)
+                self.gallery = gallery
+                self._position = (journal.generation, journal.offset)
+    
+    def _catch_up(self, journal):
+        """Bring the snapshot up to an open journal transaction
+        
+        Records another station appended since our last look are applied
+        first, so our own change lands on the rows the file will have.
+        """
+        if self._position is not None and self._position[0] == journal.generation \
+                and self._position[1] <= journal.offset:
+            records, _ = self.store.read_journal_since(journal.generation, self._position[1], journal.offset)
+            self.gallery = self.store.replay(self.gallery, records)
+        else:
+            self.gallery, _ = self.store.load_with_position(journal.offset)
+        self._position = (journal.generation, journal.offset)
+    
+    def _student_dir(self, student_id):
+        """Enrollment photo directory of a student"""
+        if student_id in ("", ".", "..") or Path(student_id).name != student_id:
+            raise ValueError(f"Invalid student ID: {student_id!r}")
+        return Path(self.config.get("paths", "known_faces_dir")) / student_id
+    
+    def _remove_photos(self, student_id, photos=None):
+        """Delete a student's enrollment photos, by default all of them"""
+        student_dir = self._student_dir(student_id)
+        if not student_dir.is_dir() or student_dir.resolve() == self.store.directory.resolve():
+            return
+        if photos is None:
+            photos = [path for path in student_dir.iterdir() if path.is_file()]
+        for photo in photos:
+            photo.unlink(missing_ok=True)
+        if not any(student_dir.iterdir()):
+            student_dir.rmdir()
+    
+    def _rewrite_student(self, student_id, encodings=(), name=None, sources=()):
+        """Replace every gallery row of a student in one journal write
+        
+        A tombstone and the new rows go out together. The manifest gets
+        lines for the removed rows (row None), for the rows that were moved
+        into the gaps, and for the new photos.
+        
+        Returns:
+            int: Number of rows removed
+        """
+        records = self.store.encode_removals([student_id])
+        if len(encodings):
+            names = [name] * len(encodings)
+            ids = [student_id] * len(encodings)
+            records = np.concatenate([records, self.store.encode_additions(encodings, names, ids)])
+        
+        with self.store.transaction() as journal:
+            self._catch_up(journal)
+            old_rows = set(self.gallery.rows_for(student_id))
+            if not old_rows and not len(encodings):
+                return 0
+            gallery, moves = self.gallery.without_student(student_id)
             
-            # Get face encoding
-            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            encodings = face_recognition.face_encodings(rgb_image)
+            # Photos are looked up by row, which takes one pass over the manifest
+            entries = []
+            moved = dict(moves)
+            released = set()
+            if old_rows:
+                manifest = self.store.read_manifest().values()
+                for entry in manifest:
+                    if entry["row"] in old_rows:
+                        entries.append(dict(entry, row=None))
+                        released.add(entry["sha1"])
+                    elif entry["row"] in moved:
+                        entries.append(dict(entry, row=moved[entry["row"]]))
+                # Identical images are stored once; keep those another row still uses
+                released -= {entry["sha1"] for entry in manifest if entry["row"] is not None
+                             and entry["row"] not in old_rows}
+                released -= {source["sha1"] for source in sources if source is not None}
+            if len(encodings):
+                entries += [dict(source, row=len(gallery) + i) for i, source in enumerate(sources)
+                            if source is not None]
+                gallery = gallery.extended(encodings, names, ids)
             
-            if len(encodings) == 0:
-                self.logger.warning(f"No face found in the image for {name}")
+            journal.write(records, entries)
+            self.gallery = gallery
+            self._position = (journal.generation, journal.offset)
+        
+        # Stored images and the chips of stored images and photos alike
+        self._discard_images(released)
+        return len(old_rows)
+    
+    def remove_student(self, student_id):
+        """Remove a student's faces, database record and enrollment photos
+        
+        With the files backend this appends one tombstone to the gallery
+        journal; the rows are dropped by moving the last rows into their
+        place, so nothing is rewritten.
+        
+        Returns:
+            bool: True if the student was found
+        """
+        self._student_dir(student_id)
+        with self._gallery_lock:
+            found = False
+            if self.db is not None:
+                images = self.db.student_images(student_id) if self.backend == "sqlite" else set()
+                found = self.db.remove_student(student_id)
+            if self.backend == "sqlite":
+                self.reload_changes()
+                self._discard_images(images - self.db.images_in_use(images))
+            else:
+                found = self._rewrite_student(student_id) > 0 or found
+            self._remove_photos(student_id)
+        
+        if found:
+            self.logger.info(f"Removed student {student_id}")
+        else:
+            self.logger.warning(f"Student {student_id} not found")
+        return found
+    
+    def replace_student_faces(self, student_id, images, name=None):
+        """Re-enroll a student from new photos, replacing all of their faces
+        
+        Args:
+            student_id: Student ID
+            images: BGR images of the student's face
+            name: New name for the student, or None to keep the current one.
+                An unknown student ID is only enrolled when a name is given.
+            
+        Returns:
+            bool: True if a face was found and the old faces were replaced
+        """
+        student_dir = self._student_dir(student_id)
+        with self._gallery_lock:
+            rows = self.gallery.rows_for(student_id)
+            if name is None and not rows and not (self.db is not None and self.db.student_exists(student_id)):
+                self.logger.warning(f"Student {student_id} not found; nothing replaced")
                 return False
+            current_name = self.gallery.identity(rows[0])[0] if rows else student_id
+            old_photos = [path for path in student_dir.glob("*") if path.is_file()]
             
-            # Add to known faces
-            self.known_face_encodings.append(encodings[0])
-            self.known_face_names.append(name)
-            self.known_face_ids.append(student_id)
-            
-            # Update encodings file
-            encoding_file = known_faces_dir / "encodings.pkl"
-            data = {
-                'encodings': self.known_face_encodings,
-                'names': self.known_face_names,
-                'ids': self.known_face_ids
-            }
-            with open(encoding_file, 'wb') as f:
-                pickle.dump(data, f)
+            encoded = [face for face in self.encode_faces((image, name or current_name, student_id) for image in images)
+                       if face[0] is not None]
+            encodings = [encoding for encoding, _, _ in encoded]
+            sources = [source for _, source, _ in encoded]
+            if not encodings:
+                self.logger.warning(f"No face found in the new photos for {student_id}; nothing replaced")
+                return False
             
-            self.logger.info(f"Added new face for {name} ({student_id})")
-            return True
+            digests = [source["sha1"] for source in sources]
+            old_images = set()
+            if self.db is not None:
+                old_images = self.db.student_images(student_id) if self.backend == "sqlite" else set()
+                if not self.db.replace_student_faces(student_id, encodings, name, images=digests):
+                    return False
+            if self.backend == "sqlite":
+                self.reload_changes()
+                self._discard_images(old_images - self.db.images_in_use(old_images))
+            else:
+                self._rewrite_student(student_id, encodings, name or current_name, sources)
+            self.store_images(pending for _, _, pending in encoded)
+            self._remove_photos(student_id, old_photos)
+        
+        self.logger.info(f"Replaced the faces of {name or current_name} ({student_id}) "
+                         f"with {len(encodings)} new encoding(s)")
+        return True
+    
+    def apply_reencoded(self, encodings):
+        """Swap in re-computed encodings for the photos in the manifest
+        
+        Rows are looked up through the manifest under the journal lock and
+        the result is published as one new generation, so readers switch
+        from the old encodings to the new ones in a single step.
+        
+        Args:
+            encodings: Dict of photo SHA-1 -> new encoding
             
-        except Exception as e:
-            self.logger.error(f"Error adding face: {e}")
+        Returns:
+            tuple: (rows replaced, rows kept as they were)
+        """
+        if self.backend != "files":
+            raise ValueError("Re-encoding is only available with the files gallery backend")
+        
+        with self._gallery_lock, self.store.transaction() as journal:
+            self._catch_up(journal)
+            gallery = self.gallery
+            manifest = self.store.read_manifest()
+            
+            new_encodings = np.array(gallery.encodings, dtype=np.float32)
+            updated = set()
+            for entry in manifest.values():
+                encoding = encodings.get(entry["sha1"])
+                if entry["row"] is not None and entry["row"] < len(gallery) and encoding is not None:
+                    new_encodings[entry["row"]] = encoding
+                    updated.add(entry["row"])
+            
+            gallery = Gallery(new_encodings, gallery.labels, gallery.identities)
+            meta = self.store.save(gallery, manifest)
+            self.gallery = gallery
+            self._position = (meta["generation"], 0)
+        return len(updated), len(gallery) - len(updated)
+    
+    def reload_changes(self):
+        """Apply gallery changes written by other stations or processes
+        
+        New journal records are read from where we left off and added to the
+        current snapshot. A new generation (compaction, photo sync, bulk
+        enrollment) is picked up by mapping it in. Either way the result is
+        swapped in as one snapshot, so process_frame is never blocked.
+        
+        Returns:
+            bool: True if the gallery changed
+        """
+        with self._gallery_lock:
+            if self.backend == "sqlite":
+                return self._reload_from_database()
+            
+            if not self.store.exists():
+                return False
+            generation, size = self.store.position()
+            if self._position == (generation, size):
+                return False
+            
+            if self._position is not None and self._position[0] == generation and size > self._position[1]:
+                records, offset = self.store.read_journal_since(generation, self._position[1])
+                self._position = (generation, offset)
+                if len(records) == 0:
+                    return False
+                self.gallery = self.store.replay(self.gallery, records)
+                removals = records["op"] == OP_REMOVE
+                removed = {student_id.decode("utf-8") for student_id in records["student_id"][removals]}
+                self.logger.info(f"Gallery reloaded: {len(records) - int(removals.sum())} new face encoding(s), "
+                                 f"{len(removed)} student(s) removed or replaced")
+                return True
+            
+            before = len(self.gallery)
+            self.gallery, self._position = self.store.load_with_position()
+            self.logger.info(f"Gallery reloaded from {generation}: "
+                             f"{len(self.gallery) - before:+d} face encoding(s)")
+            return True
+    
+    def _reload_from_database(self):
+        """Apply database changes made since the last load
+        
+        New encodings are found by rowid watermark. A tombstone means a
+        student was removed or re-enrolled: their rows are dropped and
+        whatever encodings they have now are loaded again.
+        """
+        removed, tombstone_mark = self.db.load_tombstones(self._db_tombstone_mark)
+        encodings, names, ids, watermark = self.db.load_encodings(self._db_watermark)
+        if not removed and watermark == self._db_watermark:
             return False
+        
+        removed = set(removed)
+        gallery = self.gallery
+        for student_id in removed:
+            gallery, _ = gallery.without_student(student_id)
+        kept = len(gallery)
+        keep = [i for i, student_id in enumerate(ids) if student_id not in removed]
+        gallery = gallery.extended(encodings[keep], [names[i] for i in keep], [ids[i] for i in keep])
+        if removed:
+            encodings, names, ids, _ = self.db.load_encodings(student_ids=removed, until_rowid=watermark)
+            gallery = gallery.extended(encodings, names, ids)
+        
+        self.logger.info(f"Gallery reloaded: {len(gallery) - kept} new face encoding(s), "
+                         f"{len(removed)} student(s) removed or replaced")
+        self.gallery = gallery
+        self._db_watermark = watermark
+        self._db_tombstone_mark = tombstone_mark
+        return True
+    
+    def start_watching(self):
+        """Poll the gallery files and hot-reload changes in the background"""
+        if self.watch_interval <= 0 or self._watch_thread is not None:
+            return
+        self._watch_stop.clear()
+        self._watch_thread = threading.Thread(target=self._watch, name="gallery-watcher", daemon=True)
+        self._watch_thread.start()
+    
+    def stop_watching(self):
+        """Stop the gallery watcher thread"""
+        self._watch_stop.set()
+        if self._watch_thread is not None:
+            self._watch_thread.join(self.watch_interval + 1.0)
+            self._watch_thread = None
+    
+    def _watch(self):
+        """Watcher loop; only stats two files per poll"""
+        while not self._watch_stop.wait(self.watch_interval):
+            try:
+                self.reload_changes()
+            except Exception as e:
+                self.logger.error(f"Error reloading gallery: {e}")
+    
+    def warm_up(self, frame_width=640, frame_height=480):
+        """Run detection, encoding and matching once on a blank frame
+        
+        dlib's first detection and encoding calls are much slower than the
+        ones after, so doing this at startup keeps the first camera frame
+        from stalling. It also sizes the process_frame buffers and pages in
+        the gallery.
+        """
+        import face_recognition
+        started = time.monotonic()
+        frame = np.zeros((frame_height, frame_width, 3), dtype=np.uint8)
+        self.process_frame(frame)
+        
+        # A blank frame has no faces, so encode a fixed box to load the landmark and encoder models
+        rgb_small_frame = self.buffers.get("small_rgb", (round(frame_height / self.frame_reduction),
+                                                         round(frame_width / self.frame_reduction), 3))
+        side = min(rgb_small_frame.shape[:2]) - 1
+        encodings = face_recognition.face_encodings(rgb_small_frame, [(0, side, side, 0)],
+                                                    model=self.landmark_model)
+        self.gallery.match(encodings, self.tolerance)
+        self.logger.info(f"Face recognition warmed up in {time.monotonic() - started:.2f}s")
     
     def process_frame(self, frame):
         """Process a video frame and recognize faces"""
-        # Resize frame for faster processing
-        small_frame = cv2.resize(frame, (0, 0), fx=1/self.frame_reduction, fy=1/self.frame_reduction)
-        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+        # Imported on first use; loading dlib's models takes seconds
+        import face_recognition
+        
+        # Resize frame for faster processing, into preallocated buffers
+        height, width = frame.shape[:2]
+        small_size = (round(width / self.frame_reduction), round(height / self.frame_reduction))
+        small_shape = (small_size[1], small_size[0], 3)
+        small_frame = cv2.resize(frame, small_size, dst=self.buffers.get("small", small_shape))
+        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB,
+                                       dst=self.buffers.get("small_rgb", small_shape))
         
         # Find faces in frame
         self.face_locations = face_recognition.face_locations(rgb_small_frame, model=self.model)
@@ -138,29 +888,16 @@ class FaceRecognizer:
         if len(self.face_locations) > 1:
             self.logger.info(f"Multiple faces detected: {len(self.face_locations)}")
         
-        self.face_encodings = face_recognition.face_encodings(rgb_small_frame, self.face_locations)
+        self.face_encodings = face_recognition.face_encodings(rgb_small_frame, self.face_locations,
+                                                              model=self.landmark_model)
         
-        self.face_names = []
-        self.matched_ids = []
+        # Take one reference to the current snapshot so every face in this
+        # frame is matched against the same gallery, even if enrollment swaps it
+        gallery = self.gallery
+        matches = gallery.match(self.face_encodings, self.tolerance)
         
-        # For each detected face, try to identify it
-        for face_encoding in self.face_encodings:
-            name = "Unknown"
-            student_id = None
-            
-            # Check if face matches any known face
-            if len(self.known_face_encodings) > 0:
-                matches = face_recognition.compare_faces(self.known_face_encodings, face_encoding, tolerance=self.tolerance)
-                face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-                
-                if len(face_distances) > 0:
-                    best_match_index = np.argmin(face_distances)
-                    if matches[best_match_index]:
-                        name = self.known_face_names[best_match_index]
-                        student_id = self.known_face_ids[best_match_index]
-            
-            self.face_names.append(name)
-            self.matched_ids.append(student_id)
+        self.face_names = [name for name, _ in matches]
+        self.matched_ids = [student_id for _, student_id in matches]
         
         return self.face_locations, self.face_names, self.matched_ids
     
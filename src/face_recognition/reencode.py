@@ -0,0 +1,197 @@
+import base64
+import json
+import logging
+import os
+import threading
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from .chips import ChipCache, encode_chip, encode_with_chip
+
+
+def reencode_photo(digest, chip_dir, photo_path, landmark_model, num_jitters):
+    """Encode one enrollment photo from its cached chip; runs in a worker process
+
+    A cached chip keeps the alignment made at enrollment, so landmark_model
+    is only used for photos enrolled before chips were saved. Those are
+    detected once, and their chip is cached for next time.
+
+    Returns:
+        tuple: (digest, float32 encoding bytes or None, error message or None)
+    """
+    import face_recognition
+    chips = ChipCache(chip_dir)
+    try:
+        chip = chips.load(digest)
+        if chip is not None:
+            encoding = encode_chip(chip, num_jitters)
+        else:
+            if not Path(photo_path).exists():
+                return digest, None, "no chip or photo"
+            encoding, chip = encode_with_chip(face_recognition.load_image_file(photo_path),
+                                              landmark_model, num_jitters)
+            if encoding is None:
+                return digest, None, "no face found"
+            chips.save(digest, chip)
+    except Exception as e:
+        return digest, None, str(e)
+    return digest, np.asarray(encoding, dtype=np.float32).tobytes(), None
+
+
+class ReencodeJob:
+    """Recompute every gallery encoding from the cached face chips
+
+    Run it after changing the jitter count. Chips are encoded on a process
+    pool without face detection or alignment, so they keep the landmark
+    model they were enrolled with; a new landmark model only applies to
+    faces enrolled after the change. Every result is appended to a progress
+    file in the gallery directory, so an interrupted job resumes where it
+    stopped, as long as the settings have not changed. When all photos are
+    done the new encodings are published as a single gallery generation.
+    """
+
+    PROGRESS_FILE = "reencode.progress.jsonl"
+
+    def __init__(self, recognizer, workers=None):
+        self.recognizer = recognizer
+        self.workers = workers or os.cpu_count()
+        self.logger = logging.getLogger("attendance_system")
+        self.progress_file = recognizer.store.directory / self.PROGRESS_FILE
+        self.known_faces_dir = Path(recognizer.config.get("paths", "known_faces_dir"))
+        # The landmark model only aligns photos that have no chip yet
+        self.settings = {
+            "landmark_model": recognizer.landmark_model,
+            "num_jitters": recognizer.num_jitters,
+        }
+
+        self.done = 0
+        self.total = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Run the job on a background thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run_logged, name="gallery-reencode", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop after the photos already being encoded; progress is kept"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run_logged(self):
+        """Thread body"""
+        try:
+            self.run()
+        except Exception as e:
+            self.logger.error(f"Error re-encoding gallery: {e}")
+
+    def run(self):
+        """Re-encode every photo in the manifest and swap in the new gallery
+
+        Returns:
+            bool: True if the new gallery was published, False if stopped
+        """
+        # Working copies of recent enrollments may still be queued
+        self.recognizer.image_store.flush()
+
+        results = self._load_progress()
+        if results:
+            self.logger.info(f"Resuming re-encoding: {len(results)} photo(s) already done")
+
+        # Photos enrolled while a pass was running are picked up by the next one
+        while True:
+            photos = {
+                entry["sha1"]: self._photo_path(entry)
+                for entry in self.recognizer.store.read_manifest().values()
+                if entry["row"] is not None and entry["sha1"] not in results
+            }
+            if not photos:
+                break
+            if not self._encode(photos, results):
+                self.logger.info(f"Re-encoding stopped after {self.done}/{self.total} photo(s)")
+                return False
+
+        updated, kept = self.recognizer.apply_reencoded(
+            {digest: encoding for digest, encoding in results.items() if encoding is not None}
+        )
+        self.progress_file.unlink(missing_ok=True)
+        self.logger.info(f"Gallery re-encoded: {updated} encoding(s) replaced, "
+                         f"{kept} kept because they have no chip or photo")
+        return True
+
+    def _encode(self, photos, results):
+        """Encode a set of photos on the process pool, recording each result"""
+        self.done = 0
+        self.total = len(photos)
+        started = time.monotonic()
+        with open(self.progress_file, 'a', encoding='utf-8') as progress, \
+                ProcessPoolExecutor(max_workers=self.workers) as pool:
+            if progress.tell() == 0:
+                progress.write(json.dumps({"settings": self.settings}) + "\n")
+
+            futures = [
+                pool.submit(reencode_photo, digest, str(self.recognizer.chips.directory),
+                            str(path), self.settings["landmark_model"],
+                            self.settings["num_jitters"])
+                for digest, path in photos.items()
+            ]
+            for future in as_completed(futures):
+                if self._stop.is_set():
+                    for pending in futures:
+                        pending.cancel()
+                    return False
+
+                digest, encoding, error = future.result()
+                results[digest] = np.frombuffer(encoding, dtype=np.float32) if encoding else None
+                progress.write(json.dumps({
+                    "sha1": digest,
+                    "encoding": base64.b64encode(encoding).decode("ascii") if encoding else None,
+                }) + "\n")
+                progress.flush()
+
+                if error:
+                    self.logger.warning(f"Could not re-encode {photos[digest]}: {error}")
+                self.done += 1
+                if self.done % 100 == 0 or self.done == self.total:
+                    rate = self.done / max(time.monotonic() - started, 1e-6)
+                    self.logger.info(f"Re-encoded {self.done}/{self.total} photo(s) ({rate:.1f}/s)")
+        return True
+
+    def _photo_path(self, entry):
+        """Photo to detect the face in when a manifest entry has no chip"""
+        if entry.get("store"):
+            return self.recognizer.image_store.working_path(entry["sha1"])
+        return self.known_faces_dir / entry["path"]
+
+    def _load_progress(self):
+        """Load results of an interrupted run made with the same settings"""
+        results = {}
+        if not self.progress_file.exists():
+            return results
+
+        with open(self.progress_file, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        try:
+            header = json.loads(lines[0]) if lines else {}
+        except ValueError:
+            header = {}
+        if header.get("settings") != self.settings:
+            self.logger.info("Re-encoding settings changed, starting over")
+            self.progress_file.unlink()
+            return results
+
+        for line in lines[1:]:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # A torn final line from an interrupted run
+                continue
+            encoding = result["encoding"]
+            results[result["sha1"]] = np.frombuffer(base64.b64decode(encoding), dtype=np.float32) if encoding else None
+        return results
@@ -3,10 +3,8 @@ from tkinter import ttk, messagebox, filedialog
 import cv2
 import os
 import logging
-import pandas as pd
 from datetime import datetime
 from pathlib import Path
-from PIL import Image, ImageTk
 import threading
 import time
 import sys
@@ -14,8 +12,14 @@ import sys
 from ..utils.config import Config
 from ..utils.camera_utils import get_available_cameras
 from ..utils.local_storage import LocalStorage
+from ..utils.frame_buffers import FrameBufferPool
+from ..utils.activity_monitor import ActivityMonitor
+from ..utils.resource_governor import ResourceGovernor
+from ..utils.startup_profiler import StartupProfiler
 from ..face_recognition.recognizer import FaceRecognizer
+from ..face_recognition.enrollment import EnrollmentWorker
 from ..database.db_manager import DatabaseManager
+from ..database.attendance_writer import AttendanceWriter
 
 class MainWindow:
     """Main application window for the attendance system"""
@@ -24,34 +28,150 @@ class MainWindow:
         self.root = root
         self.config = Config()
         self.logger = logging.getLogger("attendance_system")
+        self.profiler = StartupProfiler()
         
         # Initialize components
-        self.db = DatabaseManager()  # Keep for compatibility with existing code
+        with self.profiler.phase("database"):
+            self.db = DatabaseManager()  # Keep for compatibility with existing code
         self.local_storage = LocalStorage()  # Add local storage
-        self.recognizer = FaceRecognizer()
+        
+        # Attendance is written in batches off the capture thread
+        attendance_settings = self.config.get("attendance")
+        self.attendance_writer = AttendanceWriter(
+            self.db, self.local_storage,
+            batch_size=attendance_settings.get("batch_size", 64),
+            flush_interval=attendance_settings.get("flush_interval", 1.0),
+        )
+        
+        # Loading the dlib models and the gallery takes several seconds, so the
+        # recognizer is created on a background thread after the window is shown
+        self.recognizer = None
+        self.enrollment_worker = None
+        self.closing = False
+        
+        # Background startup tasks that have not finished yet
+        self.pending_startup = {"recognizer"}
+        if self.config.get("camera", "detect_cameras", default=True):
+            self.pending_startup.add("cameras")
         
         # Camera settings
         self.camera_source = self.config.get("camera", "source")
         self.frame_width = self.config.get("camera", "frame_width")
         self.frame_height = self.config.get("camera", "frame_height")
+        self.fps = self.config.get("camera", "fps")
+        
+        # Drop to a low-power capture profile when nobody is in front of the camera
+        self.activity = ActivityMonitor(self.frame_width, self.frame_height, self.fps)
+        self.governor = ResourceGovernor()
         
-        # Available cameras
+        # Available cameras, filled in by a background probe
         self.available_cameras = []
-        if self.config.get("camera", "detect_cameras", default=True):
-            self.available_cameras = get_available_cameras()
+        
+        # Bumped for every report shown, so a report still loading stops
+        self.report_generation = 0
         
         # Video capture variables
         self.cap = None
         self.is_capturing = False
         self.capture_thread = None
         
+        # Reused capture/display buffers and the PhotoImage they are pasted into
+        self.frame_buffers = FrameBufferPool()
+        self.photo_image = None
+        self.frames_processed = 0
+        
         # Track recognized people to avoid duplicate attendance marks
         self.recently_recognized = set()
         self.recognition_cooldown = 5  # seconds
         self.last_recognition_time = {}
         
         # Setup UI
-        self.setup_ui()
+        with self.profiler.phase("ui_setup"):
+            self.setup_ui()
+        self.start_background_loading()
+    
+    def start_background_loading(self):
+        """Load the recognizer and probe cameras without blocking the window"""
+        threading.Thread(target=self.load_recognizer, name="recognizer-loader", daemon=True).start()
+        if "cameras" in self.pending_startup:
+            threading.Thread(target=self.detect_cameras, name="camera-detection", daemon=True).start()
+    
+    def load_recognizer(self):
+        """Create and warm up the recognizer; runs on a background thread"""
+        started = time.monotonic()
+        try:
+            with self.profiler.phase("recognizer_load"):
+                recognizer = FaceRecognizer(self.db)
+            if self.closing:
+                return
+            self.root.after(0, self.engine_status_var.set, "Face recognition: warming up...")
+            with self.profiler.phase("warm_up"):
+                recognizer.warm_up(self.frame_width, self.frame_height)
+        except Exception as e:
+            self.logger.error(f"Error loading face recognition: {e}")
+            if not self.closing:
+                self.root.after(0, self.on_recognizer_failed)
+            return
+        
+        if not self.closing:
+            self.root.after(0, self.on_recognizer_ready, recognizer, time.monotonic() - started)
+    
+    def on_recognizer_ready(self, recognizer, seconds):
+        """Enable the camera and enrollment controls once the recognizer is loaded"""
+        if self.closing:
+            return
+        
+        self.recognizer = recognizer
+        self.recognizer.start_watching()  # Pick up students enrolled on other stations
+        self.enrollment_worker = EnrollmentWorker(self.recognizer, self.db)
+        
+        for button in (self.btn_start, self.btn_register, self.btn_rescan,
+                       self.btn_remove_student, self.btn_replace_photo):
+            button.config(state=tk.NORMAL)
+        self.engine_status_var.set(f"Face recognition: ready ({len(recognizer.gallery)} faces)")
+        self.logger.info(f"Face recognition ready after {seconds:.1f}s")
+        self.profiler.mark("recognizer_ready")
+        self.pending_startup.discard("recognizer")
+    
+    def on_recognizer_failed(self):
+        """Report a recognizer that could not be loaded; the camera stays disabled"""
+        self.engine_status_var.set("Face recognition: failed to load, see log")
+        self.pending_startup.discard("recognizer")
+    
+    def detect_cameras(self):
+        """Probe the available cameras; runs on a background thread"""
+        try:
+            with self.profiler.phase("camera_detection"):
+                cameras = get_available_cameras()
+        except Exception as e:
+            self.logger.error(f"Error detecting cameras: {e}")
+            cameras = []
+        if not self.closing:
+            self.root.after(0, self.on_cameras_detected, cameras)
+    
+    def camera_options(self):
+        """Return (label, camera index) pairs for the camera dropdown"""
+        if self.available_cameras:
+            return [(f"{cam_name} (ID: {cam_id})", str(cam_id)) for cam_id, cam_name in self.available_cameras]
+        # Default option if no cameras detected
+        return [("Default Camera (ID: 0)", "0")]
+    
+    def on_cameras_detected(self, cameras):
+        """Fill the camera dropdown with the detected cameras"""
+        self.available_cameras = cameras
+        camera_options = self.camera_options()
+        self.camera_combo['values'] = [option[0] for option in camera_options]
+        
+        # Keep the configured camera selected if it was found
+        for i, (_, cam_id) in enumerate(camera_options):
+            if int(cam_id) == self.camera_source:
+                self.camera_combo.current(i)
+                break
+        else:
+            self.camera_combo.current(0)
+        self.logger.info(f"Detected {len(cameras)} camera(s)")
+        self.profiler.mark("cameras_detected")
+        self.pending_startup.discard("cameras")
     
     def add_copyright_footer(self):
         """Add a copyright footer to the main window"""
@@ -145,12 +265,7 @@ class MainWindow:
         self.selected_camera = tk.StringVar(value=str(self.camera_source))
         
         # Create camera dropdown options
-        camera_options = []
-        if self.available_cameras:
-            camera_options = [(f"{cam_name} (ID: {cam_id})", str(cam_id)) for cam_id, cam_name in self.available_cameras]
-        else:
-            # Default option if no cameras detected
-            camera_options = [("Default Camera (ID: 0)", "0")]
+        camera_options = self.camera_options()
             
         # Create the combobox
         self.camera_combo = ttk.Combobox(frame_camera_selection, textvariable=self.selected_camera, state="readonly", width=30)
@@ -172,13 +287,18 @@ class MainWindow:
         ttk.Button(frame_camera_selection, text="Refresh List", 
                    command=self.refresh_camera_list).pack(side=tk.LEFT, padx=5)
         
-        # Control buttons
-        self.btn_start = ttk.Button(frame_controls, text="Start Camera", command=self.start_camera)
+        # Control buttons; the camera can only start once the recognizer is loaded
+        self.btn_start = ttk.Button(frame_controls, text="Start Camera", command=self.start_camera, state=tk.DISABLED)
         self.btn_start.pack(side=tk.LEFT, padx=5)
         
         self.btn_stop = ttk.Button(frame_controls, text="Stop Camera", command=self.stop_camera, state=tk.DISABLED)
         self.btn_stop.pack(side=tk.LEFT, padx=5)
         
+        # Recognizer loading status
+        self.engine_status_var = tk.StringVar(value="Face recognition: loading...")
+        engine_status_label = ttk.Label(frame_controls, textvariable=self.engine_status_var)
+        engine_status_label.pack(side=tk.RIGHT, padx=5)
+        
         # Video display
         self.video_label = ttk.Label(frame_video)
         self.video_label.pack(fill=tk.BOTH, expand=True)
@@ -201,15 +321,11 @@ class MainWindow:
         if was_capturing:
             self.stop_camera()
         
-        # Re-detect cameras
-        self.available_cameras = get_available_cameras()
+        # Re-detect cameras, bypassing the cached list
+        self.available_cameras = get_available_cameras(refresh=True)
         
         # Update dropdown options
-        camera_options = []
-        if self.available_cameras:
-            camera_options = [(f"{cam_name} (ID: {cam_id})", str(cam_id)) for cam_id, cam_name in self.available_cameras]
-        else:
-            camera_options = [("Default Camera (ID: 0)", "0")]
+        camera_options = self.camera_options()
             
         # Update combobox values
         self.camera_combo['values'] = [option[0] for option in camera_options]
@@ -248,12 +364,15 @@ class MainWindow:
             self.cap = cv2.VideoCapture(self.camera_source)
             self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.frame_width)
             self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.frame_height)
+            self.cap.set(cv2.CAP_PROP_FPS, self.fps)
+            self.activity.reset()
             
             if not self.cap.isOpened():
                 messagebox.showerror("Error", f"Could not open camera with index {self.camera_source}")
                 return
                 
             self.is_capturing = True
+            self.governor.register_camera(self.camera_source)
             self.btn_start.config(state=tk.DISABLED)
             self.btn_stop.config(state=tk.NORMAL)
             self.status_var.set(f"Camera {self.camera_source}: On")
@@ -269,18 +388,40 @@ class MainWindow:
             self.logger.error(f"Error starting camera {self.camera_source}: {e}")
             messagebox.showerror("Error", f"Could not start camera {self.camera_source}: {e}")
     
+    def apply_capture_profile(self, profile):
+        """Apply an activity profile's frame rate and resolution to the camera"""
+        self.cap.set(cv2.CAP_PROP_FPS, profile["fps"])
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, profile["frame_width"])
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, profile["frame_height"])
+    
     def update_frame(self):
         """Update the video frame in a separate thread"""
+        self.governor.pin_current_thread()
+        face_locations = []
         while self.is_capturing:
-            ret, frame = self.cap.read()
+            with self.governor.stage("capture"):
+                ret, frame = self.frame_buffers.read(self.cap)
+                captured_at = time.time()
             
             if not ret:
                 self.logger.warning("Failed to grab frame")
                 time.sleep(0.1)
                 continue
+            
+            # Switch capture profile when the camera goes quiet or wakes up
+            if self.activity.update(frame, len(face_locations)):
+                self.apply_capture_profile(self.activity.profile)
+            
+            if not (self.activity.should_recognize() and
+                    self.governor.allow_recognition(self.camera_source)):
+                # Skipped frames keep the last results for display only
+                with self.governor.stage("display"):
+                    self.display_frame(self.recognizer.annotate_frame(frame))
+                continue
                 
             # Process the frame for face recognition
-            face_locations, face_names, student_ids = self.recognizer.process_frame(frame)
+            with self.governor.stage("recognize"):
+                face_locations, face_names, student_ids = self.recognizer.process_frame(frame)
             
             # Update face count display
             self.root.after(1, lambda count=len(face_locations): 
@@ -303,9 +444,9 @@ class MainWindow:
                         self.logger.info(f"Recognized: {name} ({student_id})")
                         self.last_detection_var.set(f"Last detection: {name} ({student_id})")
                         
-                        # Mark attendance in database AND local storage
-                        self.db.mark_attendance(student_id)  # Original DB storage
-                        self.local_storage.mark_attendance(student_id, name)  # Local storage
+                        # Queue the mark for the database AND local storage, stamped
+                        # with the time the frame was captured
+                        self.attendance_writer.submit(student_id, name, captured_at)
                         
                         # Update recognition time
                         self.last_recognition_time[student_id] = current_time
@@ -321,19 +462,37 @@ class MainWindow:
                                self.recent_detections_var.set(f"Recent detections: {t}"))
             
             # Annotate frame with bounding boxes and names
-            annotated_frame = self.recognizer.annotate_frame(frame)
-            
-            # Convert to a format displayable by Tkinter
-            cv2image = cv2.cvtColor(annotated_frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(cv2image)
-            imgtk = ImageTk.PhotoImage(image=img)
-            
-            # Update UI in the main thread
-            self.root.after(1, lambda: self.update_video_display(imgtk))
+            with self.governor.stage("display"):
+                self.display_frame(self.recognizer.annotate_frame(frame))
+    
+    def display_frame(self, annotated_frame):
+        """Hand an annotated BGR frame to the main thread for display"""
+        # Convert to a format displayable by Tkinter. The RGBA buffer comes
+        # from a small ring so the main thread can paste one while the next
+        # frame is converted, and frombuffer shares its memory without copying.
+        from PIL import Image
+        height, width = annotated_frame.shape[:2]
+        display = self.frame_buffers.get("display", (height, width, 4), ring=3)
+        cv2image = cv2.cvtColor(annotated_frame, cv2.COLOR_BGR2RGBA, dst=display)
+        img = Image.frombuffer("RGBA", (width, height), cv2image, "raw", "RGBA", 0, 1)
+        self.frames_processed += 1
+        
+        # Update UI in the main thread
+        self.root.after(1, lambda img=img: self.update_video_display(img))
     
-    def update_video_display(self, imgtk):
+    def update_video_display(self, img):
         """Update the video display in the main thread"""
+        from PIL import ImageTk
         if self.is_capturing:
+            # Paste into the existing PhotoImage unless the frame size changed
+            imgtk = self.photo_image
+            if imgtk is None or (imgtk.width(), imgtk.height()) != img.size:
+                imgtk = ImageTk.PhotoImage(image=img)
+                self.photo_image = imgtk
+                self.frame_buffers.record_allocation()
+            else:
+                imgtk.paste(img)
+            
             self.video_label.configure(image=imgtk)
             self.video_label.image = imgtk
             
@@ -352,6 +511,22 @@ class MainWindow:
         if self.cap:
             self.cap.release()
         
+        self.governor.unregister_camera(self.camera_source)
+        self.governor.log_report()
+        
+        capture_stats = self.frame_buffers.stats()
+        recognizer_stats = self.recognizer.buffers.stats()
+        self.logger.info(
+            f"Frame buffers: {capture_stats['allocations'] + recognizer_stats['allocations']} allocations "
+            f"over {self.frames_processed} frames "
+            f"({(capture_stats['bytes'] + recognizer_stats['bytes']) // 1024} KiB pooled)"
+        )
+        
+        time_in_state = ", ".join(
+            f"{state} {seconds:.0f}s" for state, seconds in self.activity.summary().items()
+        )
+        self.logger.info(f"Camera activity time: {time_in_state}")
+        
         self.btn_start.config(state=tk.NORMAL)
         self.btn_stop.config(state=tk.DISABLED)
         self.status_var.set("Camera: Off")
@@ -399,26 +574,151 @@ class MainWindow:
             messagebox.showwarning("Warning", "Please capture a photo first.")
             return
             
-        # Add the student to the database AND local storage
-        db_success = self.db.register_student(name, student_id)
-        local_success = self.local_storage.register_student(name, student_id)
-        
-        if db_success or local_success:  # Allow success from either storage method
-            # Add the face to the recognizer
-            if self.recognizer.add_face(self.captured_image, name, student_id):
-                messagebox.showinfo("Success", f"Student {name} registered successfully!")
-                self.entry_student_id.delete(0, tk.END)
-                self.entry_name.delete(0, tk.END)
-                del self.captured_image
-                self.register_status_var.set("Registration complete")
-                self.logger.info(f"Student registered: {name} ({student_id})")
-            else:
-                messagebox.showerror("Error", "Failed to process face. Please try again.")
+        # Add the student to local storage; the database row and the face
+        # encoding are written together by the enrollment worker
+        self.local_storage.register_student(name, student_id)
+        
+        # Add the face to the recognizer in the background so the window stays responsive
+        self.enrollment_worker.submit(
+            self.captured_image, name, student_id,
+            callback=lambda *result: self.root.after(0, self.on_enrollment_done, *result)
+        )
+        self.entry_student_id.delete(0, tk.END)
+        self.entry_name.delete(0, tk.END)
+        del self.captured_image
+        self.register_status_var.set(
+            f"Enrolling {name}... ({self.enrollment_worker.pending} pending)"
+        )
+    
+    def on_enrollment_done(self, success, name, student_id, error=None):
+        """Report a finished background enrollment in the main thread"""
+        pending = self.enrollment_worker.pending
+        if success:
+            status = f"Registered {name} ({student_id})"
+            self.logger.info(f"Student registered: {name} ({student_id})")
+        else:
+            status = f"Failed to enroll {name} ({student_id})"
+            messagebox.showerror("Error", f"Could not register {name}: {error}. Please try again.")
+        
+        if pending:
+            status += f" - {pending} pending"
+        self.register_status_var.set(status)
+    
+    def rescan_photos(self):
+        """Update the gallery from photos added, changed or deleted on disk"""
+        self.btn_rescan.config(state=tk.DISABLED)
+        self.register_status_var.set("Rescanning photos...")
+        
+        def run():
+            try:
+                result = self.recognizer.sync_with_images()
+            except Exception as e:
+                self.logger.error(f"Error rescanning photos: {e}")
+                result = None
+            self.root.after(0, self.on_rescan_done, result)
+        
+        threading.Thread(target=run, daemon=True).start()
+    
+    def on_rescan_done(self, result):
+        """Report the result of a photo rescan in the main thread"""
+        self.btn_rescan.config(state=tk.NORMAL)
+        if result is None:
+            self.register_status_var.set("Rescan failed, see log for details")
+        else:
+            added, removed = result
+            self.register_status_var.set(f"Rescan complete: {added} added, {removed} removed")
+    
+    def replace_student_photo(self):
+        """Re-enroll an existing student from the captured photo"""
+        student_id = self.entry_student_id.get().strip()
+        name = self.entry_name.get().strip() or None  # Keep the current name if left empty
+        
+        if not student_id:
+            messagebox.showwarning("Warning", "Student ID is required.")
+            return
+        
+        if not hasattr(self, 'captured_image'):
+            messagebox.showwarning("Warning", "Please capture a photo first.")
+            return
+        
+        image = self.captured_image
+        del self.captured_image
+        self.run_student_update(
+            f"Replacing photo of {student_id}...",
+            lambda: self.recognizer.replace_student_faces(student_id, [image], name),
+            f"Replaced photo of {student_id}",
+            f"Could not replace the photo of {student_id}: no face found or student unknown."
+        )
+    
+    def remove_student(self):
+        """Delete a student, their faces and their enrollment photos"""
+        student_id = self.entry_student_id.get().strip()
+        if not student_id:
+            messagebox.showwarning("Warning", "Student ID is required.")
+            return
+        
+        if not messagebox.askyesno("Remove Student",
+                                   f"Remove student {student_id} and all of their photos?"):
+            return
+        
+        self.run_student_update(
+            f"Removing {student_id}...",
+            lambda: self.recognizer.remove_student(student_id),
+            f"Removed {student_id}",
+            f"Student ID {student_id} was not found."
+        )
+    
+    def run_student_update(self, status, update, done_message, failed_message):
+        """Run a student update in the background and report the result"""
+        self.btn_remove_student.config(state=tk.DISABLED)
+        self.btn_replace_photo.config(state=tk.DISABLED)
+        self.register_status_var.set(status)
+        
+        def run():
+            try:
+                success = update()
+            except Exception as e:
+                self.logger.error(f"Error updating student: {e}")
+                success = False
+            self.root.after(0, self.on_student_updated, success, done_message, failed_message)
+        
+        threading.Thread(target=run, daemon=True).start()
+    
+    def on_student_updated(self, success, done_message, failed_message):
+        """Report the result of a student update in the main thread"""
+        self.btn_remove_student.config(state=tk.NORMAL)
+        self.btn_replace_photo.config(state=tk.NORMAL)
+        if success:
+            self.entry_student_id.delete(0, tk.END)
+            self.entry_name.delete(0, tk.END)
+            self.register_status_var.set(done_message)
         else:
-            messagebox.showerror("Error", f"Student ID {student_id} already exists or storage error occurred.")
+            self.register_status_var.set("Update failed")
+            messagebox.showerror("Error", failed_message)
+    
+    def _report_chunks(self, date):
+        """Stream report records from the database, or from local storage if it has none
+        
+        Returns:
+            tuple: (first chunk of records or None, iterator over the rest)
+        """
+        # First try to get records from database
+        chunks = self.db.iter_attendance_report(date)
+        first = next(chunks, None)
+        
+        # If no records in database, try from local storage
+        if first is None:
+            self.logger.info("No records in database, trying local storage")
+            chunks = self.local_storage.iter_attendance_report(date)
+            first = next(chunks, None)
+        return first, chunks
     
     def generate_report(self):
-        """Generate an attendance report"""
+        """Generate an attendance report
+        
+        Records are added a page at a time between Tk events, so a long
+        history fills in progressively instead of freezing the window.
+        """
         try:
             date = self.date_var.get().strip()
             
@@ -430,23 +730,28 @@ class MainWindow:
                 messagebox.showerror("Error", "Invalid date format. Please use YYYY-MM-DD")
                 return
                 
-            # Clear existing data
-            for item in self.report_tree.get_children():
-                self.report_tree.delete(item)
-                
-            # First try to get records from database
-            records = self.db.get_attendance_report(date)
-            
-            # If no records in database, try from local storage
-            if not records:
-                self.logger.info("No records in database, trying local storage")
-                records = self.local_storage.get_attendance_report(date)
+            # Clear existing data, and stop a report that is still loading
+            self.report_generation += 1
+            self.report_tree.delete(*self.report_tree.get_children())
                 
-            if not records:
+            records, chunks = self._report_chunks(date)
+            if records is None:
                 self.logger.info("No attendance records found")
                 messagebox.showinfo("Information", "No attendance records found for the specified date.")
                 return
                 
+            self.show_report_chunk(self.report_generation, date, records, chunks, 0)
+                
+        except Exception as e:
+            self.logger.error(f"Error generating report: {e}")
+            messagebox.showerror("Error", f"Could not generate report: {e}")
+    
+    def show_report_chunk(self, generation, date, records, chunks, shown):
+        """Display one chunk of report records and schedule the next"""
+        if generation != self.report_generation or self.closing:
+            return
+        
+        try:
             # Display records in the treeview
             for record in records:
                 self.report_tree.insert("", tk.END, values=(
@@ -456,27 +761,26 @@ class MainWindow:
                     record["time"],
                     record["status"]
                 ))
-                
-            self.logger.info(f"Generated report for {date if date else 'all dates'}")
-                
+            shown += len(records)
+            records = next(chunks, None)
         except Exception as e:
             self.logger.error(f"Error generating report: {e}")
-            messagebox.showerror("Error", f"Could not generate report: {e}")
+            messagebox.showerror("Error", f"Could not load the rest of the report after {shown} record(s): {e}")
+            return
+        
+        if records is not None:
+            self.root.after(1, self.show_report_chunk, generation, date, records, chunks, shown)
+        else:
+            self.logger.info(f"Generated report for {date if date else 'all dates'}: {shown} record(s)")
     
     def export_report(self):
-        """Export the attendance report to a CSV file"""
+        """Export the attendance report to a CSV file, a chunk at a time"""
         try:
             # Get the date from the filter
             date = self.date_var.get().strip()
             
-            # First try to get records from database
-            records = self.db.get_attendance_report(date)
-            
-            # If no records in database, try from local storage
-            if not records:
-                records = self.local_storage.get_attendance_report(date)
-            
-            if not records:
+            records, chunks = self._report_chunks(date)
+            if records is None:
                 messagebox.showwarning("Warning", "No records to export")
                 return
                 
@@ -490,9 +794,12 @@ class MainWindow:
             if not filename:
                 return
                 
-            # Save to CSV
-            df = pd.DataFrame(records)
-            df.to_csv(filename, index=False)
+            # Save to CSV; pandas is only loaded when a report is exported
+            import pandas as pd
+            with open(filename, 'w', newline='', encoding='utf-8') as f:
+                pd.DataFrame(records).to_csv(f, index=False)
+                for records in chunks:
+                    pd.DataFrame(records).to_csv(f, index=False, header=False)
             
             messagebox.showinfo("Success", f"Report exported to {filename}")
             self.logger.info(f"Report exported to {filename}")
@@ -503,8 +810,19 @@ class MainWindow:
     
     def on_close(self):
         """Handle window close event"""
+        self.closing = True
         if self.is_capturing:
             self.stop_camera()
+        
+        # Let queued enrollments finish so captured students are not lost
+        if self.recognizer is not None:
+            self.enrollment_worker.stop(timeout=10.0)
+            self.recognizer.image_store.close()
+            self.recognizer.stop_watching()
+        
+        # Write any attendance marks still queued before the database closes
+        self.attendance_writer.close()
+        self.db.close()
         self.root.destroy()
     
     def setup_register_tab(self):
@@ -535,9 +853,18 @@ class MainWindow:
         self.btn_capture_photo = ttk.Button(frame_reg_controls, text="Capture Photo", command=self.capture_photo)
         self.btn_capture_photo.pack(side=tk.LEFT, padx=5)
         
-        self.btn_register = ttk.Button(frame_reg_controls, text="Register Student", command=self.register_student)
+        self.btn_register = ttk.Button(frame_reg_controls, text="Register Student", command=self.register_student, state=tk.DISABLED)
         self.btn_register.pack(side=tk.RIGHT, padx=5)
         
+        self.btn_rescan = ttk.Button(frame_reg_controls, text="Rescan Photos", command=self.rescan_photos, state=tk.DISABLED)
+        self.btn_rescan.pack(side=tk.RIGHT, padx=5)
+        
+        self.btn_remove_student = ttk.Button(frame_reg_controls, text="Remove Student", command=self.remove_student, state=tk.DISABLED)
+        self.btn_remove_student.pack(side=tk.RIGHT, padx=5)
+        
+        self.btn_replace_photo = ttk.Button(frame_reg_controls, text="Replace Photo", command=self.replace_student_photo, state=tk.DISABLED)
+        self.btn_replace_photo.pack(side=tk.RIGHT, padx=5)
+        
         # Register camera status
         self.register_status_var = tk.StringVar(value="Ready")
         register_status_label = ttk.Label(frame_reg_controls, textvariable=self.register_status_var)
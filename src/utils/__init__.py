@@ -2,3 +2,7 @@ from .config import Config
 from .logger import Logger
 from .camera_utils import get_available_cameras
 from .local_storage import LocalStorage
+from .frame_buffers import FrameBufferPool
+from .activity_monitor import ActivityMonitor
+from .resource_governor import ResourceGovernor
+from .startup_profiler import StartupProfiler
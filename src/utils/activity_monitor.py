@@ -0,0 +1,145 @@
+import cv2
+import logging
+import time
+from .config import Config
+from .frame_buffers import FrameBufferPool
+
+ACTIVE = "active"
+IDLE = "idle"
+SLEEP = "sleep"
+
+
+class ActivityMonitor:
+    """Track camera activity and pick a capture profile to save power
+
+    The monitor moves between three states based on how long it has been
+    since a face or motion was last seen:
+
+        active -> idle  after ``idle_after`` quiet seconds
+        idle   -> sleep after ``sleep_after`` quiet seconds
+        any    -> active as soon as a face or motion is seen
+
+    Each state has a profile (camera FPS, resolution and how often to run
+    recognition) that the capture loop applies when the state changes.
+    """
+
+    # Motion is detected on a tiny grayscale thumbnail so it costs almost nothing
+    THUMBNAIL_SIZE = (64, 48)
+
+    def __init__(self, frame_width, frame_height, fps):
+        self.config = Config()
+        self.logger = logging.getLogger("attendance_system")
+        settings = self.config.get("power_saving")
+
+        self.enabled = settings.get("enabled", True)
+        self.idle_after = settings.get("idle_after", 30)
+        self.sleep_after = settings.get("sleep_after", 300)
+        self.motion_threshold = settings.get("motion_threshold", 0.01)
+        self.pixel_threshold = settings.get("pixel_threshold", 25)
+
+        idle = settings.get("idle", {})
+        sleep = settings.get("sleep", {})
+        self.profiles = {
+            ACTIVE: {
+                "fps": fps,
+                "frame_width": frame_width,
+                "frame_height": frame_height,
+                "recognition_interval": 1,
+            },
+            IDLE: {
+                "fps": idle.get("fps", 10),
+                "frame_width": idle.get("frame_width", frame_width),
+                "frame_height": idle.get("frame_height", frame_height),
+                "recognition_interval": idle.get("recognition_interval", 3),
+            },
+            SLEEP: {
+                "fps": sleep.get("fps", 2),
+                "frame_width": sleep.get("frame_width", 320),
+                "frame_height": sleep.get("frame_height", 240),
+                "recognition_interval": sleep.get("recognition_interval", 0),
+            },
+        }
+
+        self.buffers = FrameBufferPool()
+        self.reset()
+
+    def reset(self):
+        """Start over in the active state"""
+        now = time.monotonic()
+        self.state = ACTIVE
+        self.state_since = now
+        self.last_activity = now
+        self.time_in_state = {ACTIVE: 0.0, IDLE: 0.0, SLEEP: 0.0}
+        self.frame_count = 0
+        self._previous = None
+        self._current = None
+
+    @property
+    def profile(self):
+        """Capture profile for the current state"""
+        return self.profiles[self.state]
+
+    def detect_motion(self, frame):
+        """Return True if the frame differs enough from the previous one"""
+        width, height = self.THUMBNAIL_SIZE
+        small = cv2.resize(frame, self.THUMBNAIL_SIZE, dst=self.buffers.get("small", (height, width, 3)),
+                           interpolation=cv2.INTER_AREA)
+
+        # Alternate between two gray buffers so the previous thumbnail survives
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=self.buffers.get("gray", (height, width), ring=2))
+        self._previous, self._current = self._current, gray
+        if self._previous is None:
+            return False
+
+        diff = cv2.absdiff(self._current, self._previous, dst=self.buffers.get("diff", (height, width)))
+        changed = cv2.countNonZero(cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=diff)[1])
+        return changed > self.motion_threshold * width * height
+
+    def should_recognize(self):
+        """Whether recognition should run on the current frame"""
+        interval = self.profile["recognition_interval"]
+        return interval > 0 and self.frame_count % interval == 0
+
+    def update(self, frame, face_count=0):
+        """Feed a captured frame and the faces found in the previous one
+
+        Args:
+            frame: BGR frame that was just captured
+            face_count: Number of faces seen in the last recognized frame
+
+        Returns:
+            bool: True if the state changed and the capture profile should be
+                re-applied
+        """
+        self.frame_count += 1
+        if not self.enabled:
+            return False
+
+        now = time.monotonic()
+        if face_count > 0 or self.detect_motion(frame):
+            self.last_activity = now
+
+        quiet = now - self.last_activity
+        if quiet >= self.sleep_after:
+            state = SLEEP
+        elif quiet >= self.idle_after:
+            state = IDLE
+        else:
+            state = ACTIVE
+
+        if state == self.state:
+            return False
+
+        elapsed = now - self.state_since
+        self.time_in_state[self.state] += elapsed
+        self.logger.info(f"Camera activity: {self.state} -> {state} after {elapsed:.1f}s")
+        self.state = state
+        self.state_since = now
+        self.frame_count = 0
+        return True
+
+    def summary(self):
+        """Return seconds spent in each state, including the current one"""
+        totals = dict(self.time_in_state)
+        totals[self.state] += time.monotonic() - self.state_since
+        return totals
@@ -1,41 +1,188 @@
 import cv2
+import json
 import logging
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from .config import Config
 
-def get_available_cameras(max_cameras=10):
+SYSFS_VIDEO_DIR = Path("/sys/class/video4linux")
+
+# One discovery result per process, shared by every caller
+_cameras = None
+_cameras_lock = threading.Lock()
+
+def get_available_cameras(max_cameras=10, refresh=False):
     """
     Detect available cameras on the system.
-    
+
+    On Linux only the /dev/video* nodes that exist are probed, all at once,
+    and they are named from sysfs. The result is cached on disk until a
+    video device is added or removed, and is shared by every caller in the
+    process.
+
     Args:
-        max_cameras (int): Maximum number of cameras to check for
-        
+        max_cameras (int): Maximum number of cameras to check for where
+            video devices cannot be listed
+        refresh (bool): Probe the cameras again instead of using the cache
+
     Returns:
-        list: List of tuples (index, status) of available cameras
+        list: List of tuples (index, name) of available cameras
+    """
+    global _cameras
+    with _cameras_lock:
+        if _cameras is None or refresh:
+            _cameras = _discover_cameras(max_cameras, refresh)
+        return list(_cameras)
+
+def _discover_cameras(max_cameras, refresh):
+    """Probe the cameras, reusing the disk cache for those already found
+
+    Only cameras that answered are cached. A device that failed or timed
+    out (e.g. busy or slow to start) is probed again on the next start.
     """
     logger = logging.getLogger("attendance_system")
-    logger.info("Scanning for available cameras...")
-    
+    config = Config()
+    timeout = config.get("camera", "probe_timeout", default=3.0)
+    cache_file = Path(config.get("paths", "camera_cache", default="data/camera_cache.json"))
+
+    cached = {}
+    devices = _video_devices()
+    if devices is None:
+        # Cannot list devices here: try every index, and do not cache
+        candidates, backend, fingerprint = list(range(max_cameras)), cv2.CAP_ANY, None
+    else:
+        candidates, backend = sorted(devices), cv2.CAP_V4L2
+        fingerprint = _fingerprint(devices)
+        if not refresh:
+            cached = dict(_read_cache(cache_file, fingerprint) or [])
+            candidates = [i for i in candidates if i not in cached]
+            if cached:
+                logger.info(f"Using cached camera list: {len(cached)} camera(s)")
+
+    found = {}
+    if candidates:
+        logger.info(f"Scanning for available cameras ({len(candidates)} candidate(s))...")
+        found = _probe_all(candidates, backend, timeout)
+
     available_cameras = []
-    
-    for i in range(max_cameras):
-        cap = cv2.VideoCapture(i)
-        if cap is not None and cap.isOpened():
-            ret, frame = cap.read()
-            if ret:
-                # Camera works and returns frames
-                camera_name = f"Camera {i}"
-                # Try to get camera name (works on some systems)
-                try:
-                    camera_name = cap.getBackendName()
-                except:
-                    pass
-                
-                logger.info(f"Found camera at index {i}: {camera_name}")
-                available_cameras.append((i, camera_name))
-            cap.release()
-    
+    for i in sorted(set(found) | set(cached)):
+        if i in cached:
+            available_cameras.append((i, cached[i]))
+            continue
+        camera_name = (devices or {}).get(i) or found[i]
+        logger.info(f"Found camera at index {i}: {camera_name}")
+        available_cameras.append((i, camera_name))
+
     if not available_cameras:
         logger.warning("No cameras detected")
-    else:
+    elif found:
         logger.info(f"Found {len(available_cameras)} camera(s)")
-        
+
+    if fingerprint is not None and (found or refresh or not cached):
+        _write_cache(cache_file, fingerprint, available_cameras)
     return available_cameras
+
+def _video_devices():
+    """Return {index: sysfs name or None} for every /dev/videoN node, or None if not on Linux"""
+    if not sys.platform.startswith("linux"):
+        return None
+
+    devices = {}
+    for path in Path("/dev").glob("video*"):
+        match = re.fullmatch(r"video(\d+)", path.name)
+        if match is None:
+            continue
+        try:
+            name = (SYSFS_VIDEO_DIR / path.name / "name").read_text().strip() or None
+        except OSError:
+            name = None
+        devices[int(match.group(1))] = name
+    return devices
+
+def _fingerprint(devices):
+    """Identify the current video devices; device nodes are recreated when a camera is plugged in"""
+    fingerprint = []
+    for index, name in sorted(devices.items()):
+        try:
+            stat = os.stat(f"/dev/video{index}")
+        except OSError:
+            continue
+        fingerprint.append([index, name, stat.st_rdev, stat.st_ctime_ns])
+    return fingerprint
+
+def _probe(index, backend):
+    """Open a camera and read one frame
+
+    Returns:
+        str: The backend name if the camera returns frames, otherwise None
+    """
+    cap = cv2.VideoCapture(index, backend)
+    try:
+        if not cap.isOpened():
+            return None
+        ret, _ = cap.read()
+        if not ret:
+            return None
+        try:
+            return cap.getBackendName()
+        except cv2.error:
+            return f"Camera {index}"
+    finally:
+        cap.release()
+
+def _probe_all(candidates, backend, timeout):
+    """Probe every candidate on its own thread, waiting at most ``timeout`` seconds
+
+    A probe that hangs is left behind on its daemon thread and its camera is
+    treated as unavailable.
+
+    Returns:
+        dict: index -> backend name of each camera that returned a frame
+    """
+    logger = logging.getLogger("attendance_system")
+    results = {}
+
+    def run(index):
+        try:
+            results[index] = _probe(index, backend)
+        except Exception as e:
+            logger.debug(f"Error probing camera {index}: {e}")
+
+    threads = [threading.Thread(target=run, args=(i,), name=f"camera-probe-{i}", daemon=True)
+               for i in candidates]
+    for thread in threads:
+        thread.start()
+
+    deadline = time.monotonic() + timeout
+    for index, thread in zip(candidates, threads):
+        thread.join(max(0.0, deadline - time.monotonic()))
+        if thread.is_alive():
+            logger.warning(f"Camera {index} did not respond within {timeout}s")
+
+    return {index: name for index, name in dict(results).items() if name is not None}
+
+def _read_cache(cache_file, fingerprint):
+    """Return the cached cameras if the devices have not changed since, otherwise None"""
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cache.get("fingerprint") != fingerprint:
+        return None
+    return [(index, name) for index, name in cache.get("cameras", [])]
+
+def _write_cache(cache_file, fingerprint, cameras):
+    """Atomically write the camera cache"""
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_name(f".{cache_file.name}.{os.getpid()}.tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"fingerprint": fingerprint, "cameras": cameras}, f)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        logging.getLogger("attendance_system").warning(f"Could not write camera cache: {e}")
@@ -0,0 +1,95 @@
+import threading
+import numpy as np
+
+
+class FrameBufferPool:
+    """Pool of preallocated image buffers reused across frames
+
+    Each named slot holds a small ring of arrays with a fixed shape. Callers
+    pass the buffers as ``dst=`` targets to OpenCV so the capture loop stops
+    allocating a new array for every frame. ``allocations`` counts how many
+    arrays were actually created, which should stay flat once the first few
+    frames have been processed.
+    """
+
+    def __init__(self):
+        self._slots = {}
+        self._lock = threading.Lock()
+        self.allocations = 0
+        self.requests = 0
+
+    def get(self, name, shape, dtype=np.uint8, ring=1):
+        """Return the next buffer of a slot, allocating only if the shape changed
+
+        Args:
+            name: Slot name
+            shape: Required array shape
+            dtype: Required array dtype
+            ring: Number of buffers to rotate through, for consumers that
+                hold on to a buffer while the next frame is produced
+
+        Returns:
+            numpy.ndarray: A buffer with the requested shape and dtype
+        """
+        shape = tuple(shape)
+        dtype = np.dtype(dtype)
+        with self._lock:
+            self.requests += 1
+            slot = self._slots.get(name)
+            if slot is None or slot["shape"] != shape or slot["dtype"] != dtype or len(slot["buffers"]) != ring:
+                slot = {
+                    "shape": shape,
+                    "dtype": dtype,
+                    "buffers": [np.empty(shape, dtype=dtype) for _ in range(ring)],
+                    "next": 0,
+                }
+                self._slots[name] = slot
+                self.allocations += ring
+
+            buffer = slot["buffers"][slot["next"]]
+            slot["next"] = (slot["next"] + 1) % ring
+            return buffer
+
+    def read(self, cap, name="frame"):
+        """Read a frame from a cv2.VideoCapture into a pooled buffer
+
+        The first frame (or a frame whose size changed) is allocated by
+        OpenCV and adopted into the pool; later reads decode in place.
+        """
+        with self._lock:
+            self.requests += 1
+            slot = self._slots.get(name)
+            buffer = slot["buffers"][0] if slot else None
+
+        if buffer is None:
+            ret, frame = cap.read()
+        else:
+            ret, frame = cap.read(buffer)
+
+        if ret and frame is not buffer:
+            with self._lock:
+                self._slots[name] = {
+                    "shape": frame.shape,
+                    "dtype": frame.dtype,
+                    "buffers": [frame],
+                    "next": 0,
+                }
+                self.allocations += 1
+        return ret, frame
+
+    def record_allocation(self, count=1):
+        """Count an allocation made outside the pool, e.g. a new PhotoImage"""
+        with self._lock:
+            self.allocations += count
+
+    def stats(self):
+        """Return allocation statistics for the pool"""
+        with self._lock:
+            return {
+                "slots": len(self._slots),
+                "allocations": self.allocations,
+                "requests": self.requests,
+                "bytes": sum(
+                    buffer.nbytes for slot in self._slots.values() for buffer in slot["buffers"]
+                ),
+            }
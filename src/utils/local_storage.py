@@ -3,7 +3,7 @@ import os
 import logging
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 from .config import Config
 
 class LocalStorage:
@@ -84,6 +84,39 @@ class LocalStorage:
             self.logger.info(f"Attendance marked for student {name} ({student_id}) at {current_time}")
         return success
         
+    def mark_attendance_batch(self, marks) -> int:
+        """Mark attendance for several students with one file read and write
+        
+        Args:
+            marks: Iterable of (student_id, name, timestamp) tuples, with the
+                epoch seconds when each student was seen
+                
+        Returns:
+            int: Number of new attendance records
+        """
+        records = self._load_data(self.attendance_file) or []
+        marked = {(record.get("student_id"), record.get("date")) for record in records}
+        
+        added = 0
+        for student_id, name, timestamp in marks:
+            seen_at = datetime.fromtimestamp(timestamp)
+            current_date = seen_at.strftime("%Y-%m-%d")
+            if (student_id, current_date) in marked:
+                continue
+            marked.add((student_id, current_date))
+            records.append({
+                "student_id": student_id,
+                "name": name,
+                "date": current_date,
+                "time": seen_at.strftime("%H:%M:%S"),
+                "status": "present"
+            })
+            added += 1
+        
+        if added and not self._save_data(self.attendance_file, records):
+            return 0
+        return added
+        
     def get_attendance_report(self, date=None) -> List[Dict]:
         """Get attendance report for a specific date or all dates"""
         records = self._load_data(self.attendance_file) or []
@@ -94,6 +127,12 @@ class LocalStorage:
         
         return records
         
+    def iter_attendance_report(self, date=None, chunk_size=1000) -> Iterator[List[Dict]]:
+        """Yield the attendance report in chunks, like DatabaseManager.iter_attendance_report"""
+        records = self.get_attendance_report(date)
+        for start in range(0, len(records), chunk_size):
+            yield records[start:start + chunk_size]
+        
     def register_student(self, name: str, student_id: str) -> bool:
         """Register a new student"""
         # In a real implementation, you would save this to a students file
@@ -0,0 +1,206 @@
+import cv2
+import os
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from .config import Config
+
+
+class ResourceGovernor:
+    """Keep the attendance system within its share of the host's CPU
+
+    The governor applies the ``resources`` section of the configuration:
+    it limits OpenCV's internal thread pool, pins the process and our worker
+    threads to a set of cores, and caps how often each camera runs face
+    recognition so that measured process CPU usage stays near a target
+    percentage. It also accounts CPU time per processing stage so hosts can
+    be sized from real numbers.
+
+    Like Config, the governor is a process-wide singleton.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super(ResourceGovernor, cls).__new__(cls)
+                cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        """Load settings and initialize counters"""
+        self.config = Config()
+        self.logger = logging.getLogger("attendance_system")
+        settings = self.config.get("resources")
+
+        self.opencv_threads = settings.get("opencv_threads", 0)
+        self.cpu_affinity = set(settings.get("cpu_affinity") or [])
+        self.worker_affinity = set(settings.get("worker_affinity") or [])
+        self.target_cpu_percent = settings.get("target_cpu_percent", 0)
+        self.max_recognition_fps = settings.get("max_recognition_fps", 30)
+        self.min_recognition_fps = settings.get("min_recognition_fps", 1)
+        self.report_interval = settings.get("report_interval", 60)
+
+        self._lock = threading.Lock()
+        self._cameras = {}
+        self.recognition_fps = self.max_recognition_fps
+
+        # CPU usage sampling
+        self._sample_wall = time.monotonic()
+        self._sample_cpu = time.process_time()
+        self.cpu_percent = 0.0
+
+        # Per-stage accounting: name -> [cpu seconds, wall seconds, calls]
+        self._stages = {}
+        self._report_since = time.monotonic()
+
+    @property
+    def core_count(self):
+        """Number of cores this process is allowed to run on"""
+        if hasattr(os, "sched_getaffinity"):
+            return len(os.sched_getaffinity(0))
+        return os.cpu_count() or 1
+
+    def apply(self):
+        """Apply thread-count and process affinity limits"""
+        if self.opencv_threads:
+            cv2.setNumThreads(self.opencv_threads)
+            self.logger.info(f"OpenCV limited to {self.opencv_threads} thread(s)")
+
+        if self.cpu_affinity:
+            if hasattr(os, "sched_setaffinity"):
+                try:
+                    os.sched_setaffinity(0, self.cpu_affinity)
+                    self.logger.info(f"Process pinned to cores {sorted(self.cpu_affinity)}")
+                except OSError as e:
+                    self.logger.warning(f"Could not set process CPU affinity: {e}")
+            else:
+                self.logger.warning("CPU affinity is not supported on this platform")
+
+    def pin_current_thread(self):
+        """Pin the calling worker thread to the configured worker cores"""
+        if not self.worker_affinity or not hasattr(os, "sched_setaffinity"):
+            return
+        try:
+            # On Linux a thread's native ID can be used as a PID for affinity calls
+            os.sched_setaffinity(threading.get_native_id(), self.worker_affinity)
+        except OSError as e:
+            self.logger.warning(f"Could not set worker CPU affinity: {e}")
+
+    def register_camera(self, camera_id):
+        """Start tracking recognition rate for a camera"""
+        with self._lock:
+            self._cameras[camera_id] = 0.0
+
+    def unregister_camera(self, camera_id):
+        """Stop tracking a camera"""
+        with self._lock:
+            self._cameras.pop(camera_id, None)
+
+    def allow_recognition(self, camera_id):
+        """Whether a camera may run recognition on its current frame
+
+        The overall recognition rate is shared evenly between registered
+        cameras.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._sample_cpu_usage(now)
+            cameras = max(len(self._cameras), 1)
+            interval = cameras / self.recognition_fps
+            last = self._cameras.get(camera_id, 0.0)
+            if now - last < interval:
+                return False
+            self._cameras[camera_id] = now
+            return True
+
+    def _sample_cpu_usage(self, now):
+        """Measure process CPU usage and adjust the recognition rate
+
+        Called with the lock held. Usage is sampled about once a second; the
+        rate is scaled toward the target and grows back slowly when there is
+        headroom.
+        """
+        elapsed = now - self._sample_wall
+        if elapsed < 1.0:
+            return
+
+        cpu = time.process_time()
+        self.cpu_percent = 100.0 * (cpu - self._sample_cpu) / (elapsed * self.core_count)
+        self._sample_wall = now
+        self._sample_cpu = cpu
+
+        if not self.target_cpu_percent:
+            return
+
+        if self.cpu_percent > self.target_cpu_percent:
+            fps = self.recognition_fps * self.target_cpu_percent / self.cpu_percent
+        else:
+            fps = self.recognition_fps * 1.1
+        fps = min(max(fps, self.min_recognition_fps), self.max_recognition_fps)
+
+        if abs(fps - self.recognition_fps) >= 0.5:
+            self.logger.debug(
+                f"CPU at {self.cpu_percent:.0f}% (target {self.target_cpu_percent}%), "
+                f"recognition capped at {fps:.1f} FPS"
+            )
+        self.recognition_fps = fps
+
+    @contextmanager
+    def stage(self, name):
+        """Account the CPU and wall time spent in a processing stage"""
+        cpu_start = time.thread_time()
+        wall_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            cpu = time.thread_time() - cpu_start
+            wall = time.perf_counter() - wall_start
+            with self._lock:
+                totals = self._stages.setdefault(name, [0.0, 0.0, 0])
+                totals[0] += cpu
+                totals[1] += wall
+                totals[2] += 1
+            self._maybe_report()
+
+    def stage_report(self):
+        """Return per-stage CPU usage since the last report
+
+        Returns:
+            dict: name -> {"cpu_percent", "cpu_ms_per_call", "wall_ms_per_call", "calls"}
+        """
+        with self._lock:
+            period = max(time.monotonic() - self._report_since, 1e-6)
+            return {
+                name: {
+                    "cpu_percent": 100.0 * cpu / period,
+                    "cpu_ms_per_call": 1000.0 * cpu / calls,
+                    "wall_ms_per_call": 1000.0 * wall / calls,
+                    "calls": calls,
+                }
+                for name, (cpu, wall, calls) in self._stages.items()
+            }
+
+    def log_report(self):
+        """Log per-stage CPU usage and start a new reporting period"""
+        report = self.stage_report()
+        if report:
+            stages = ", ".join(
+                f"{name} {values['cpu_percent']:.1f}% ({values['cpu_ms_per_call']:.1f} ms/call)"
+                for name, values in sorted(report.items())
+            )
+            self.logger.info(
+                f"CPU by stage: {stages}; process {self.cpu_percent:.0f}% of "
+                f"{self.core_count} core(s), recognition cap {self.recognition_fps:.1f} FPS"
+            )
+        with self._lock:
+            self._stages = {}
+            self._report_since = time.monotonic()
+
+    def _maybe_report(self):
+        """Log the stage report once per reporting interval"""
+        if self.report_interval and time.monotonic() - self._report_since >= self.report_interval:
+            self.log_report()
@@ -0,0 +1,187 @@
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+
+def import_times(module):
+    """Import a module in a fresh interpreter under ``-X importtime``
+
+    Returns:
+        list: (package, self microseconds, cumulative microseconds) in import order
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Could not import {module}: {result.stderr.strip().splitlines()[-1]}")
+
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, package = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue  # Column header
+        times.append((package.strip(), int(self_us), int(cumulative_us)))
+    return times
+
+
+def peak_rss_kib():
+    """Peak resident set size of this process in KiB, or None where unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+class StartupProfiler:
+    """Wall and CPU time of each startup phase, for ``main.py --profile-startup``
+
+    Phases may run on background threads (the recognizer and camera
+    loaders), so CPU time is measured per thread. Like Config, the profiler
+    is a process-wide singleton; until it is enabled, ``phase`` and
+    ``mark`` do nothing.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super(StartupProfiler, cls).__new__(cls)
+                cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        """Initialize an empty, disabled profile"""
+        self.enabled = False
+        self.started = time.perf_counter()
+        self.phases = []
+        self.marks = {}
+        self._lock = threading.Lock()
+
+    def enable(self, started=None):
+        """Start recording
+
+        Args:
+            started: perf_counter() value that startup is measured from,
+                e.g. taken before the application modules were imported
+        """
+        self.enabled = True
+        if started is not None:
+            self.started = started
+
+    def record(self, name, wall_start, wall_seconds, cpu_seconds):
+        """Add a phase that was timed by the caller"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.phases.append({
+                "name": name,
+                "thread": threading.current_thread().name,
+                "start_s": round(wall_start - self.started, 4),
+                "wall_s": round(wall_seconds, 4),
+                "cpu_s": round(cpu_seconds, 4),
+            })
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block as a startup phase"""
+        if not self.enabled:
+            yield
+            return
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            self.record(name, wall_start, time.perf_counter() - wall_start, time.thread_time() - cpu_start)
+
+    def mark(self, name):
+        """Record when a startup milestone (e.g. the window showing) was reached"""
+        if self.enabled:
+            with self._lock:
+                self.marks[name] = round(time.perf_counter() - self.started, 4)
+
+    def report(self, import_module=None, top_imports=15):
+        """Build the profile as a JSON-serializable dict
+
+        Args:
+            import_module: Module whose imports are timed in a fresh interpreter
+            top_imports: Number of slowest imports to include
+        """
+        from .config import Config
+        with self._lock:
+            report = {
+                "version": Config().get("app", "version"),
+                "recorded_at": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "total_s": round(time.perf_counter() - self.started, 4),
+                "process_cpu_s": round(time.process_time(), 4),
+                "peak_rss_kib": peak_rss_kib(),
+                "marks": dict(self.marks),
+                "phases": sorted(self.phases, key=lambda phase: phase["start_s"]),
+            }
+
+        if import_module:
+            try:
+                times = import_times(import_module)
+            except RuntimeError as e:
+                report["imports"] = {"module": import_module, "error": str(e)}
+            else:
+                slowest = sorted(times, key=lambda t: t[2], reverse=True)[:top_imports]
+                report["imports"] = {
+                    "module": import_module,
+                    "total_ms": round(sum(self_us for _, self_us, _ in times) / 1000, 1),
+                    "modules": len(times),
+                    "slowest": [
+                        {"module": package, "self_ms": self_us / 1000, "cumulative_ms": cumulative_us / 1000}
+                        for package, self_us, cumulative_us in slowest
+                    ],
+                }
+        return report
+
+    def write(self, path, import_module=None):
+        """Write the JSON report and log a one-line summary
+
+        Returns:
+            dict: The report
+        """
+        report = self.report(import_module)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+        marks = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in report["marks"].items())
+        slowest = ", ".join(
+            f"{phase['name']} {phase['wall_s']:.2f}s"
+            for phase in sorted(report["phases"], key=lambda phase: phase["wall_s"], reverse=True)[:3]
+        )
+        rss = report["peak_rss_kib"]
+        rss = f"{rss / 1024:.0f} MiB" if rss else "n/a"
+        logging.getLogger("attendance_system").info(
+            f"Startup profile: {marks or 'no milestones'}; slowest phases: {slowest}; "
+            f"CPU {report['process_cpu_s']:.2f}s, peak RSS {rss}; report written to {path}"
+        )
+        return report
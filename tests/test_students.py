@@ -0,0 +1,32 @@
+"""Tests for re-enrolling students"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("face_recognition")
+
+from src.database.db_manager import DatabaseManager
+from src.face_recognition.recognizer import FaceRecognizer
+
+
+@pytest.fixture
+def recognizer(tmp_path, monkeypatch):
+    # The data paths in config.yaml are relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    db = DatabaseManager()
+    recognizer = FaceRecognizer(db)
+    yield recognizer
+    recognizer.image_store.close()
+    db.close()
+
+
+def test_replace_rejects_unknown_student(recognizer, monkeypatch):
+    def encode_faces(entries):
+        raise AssertionError("photos of an unknown student were encoded")
+
+    monkeypatch.setattr(recognizer, "encode_faces", encode_faces)
+    image = np.zeros((40, 40, 3), np.uint8)
+
+    assert recognizer.replace_student_faces("NOPE", [image]) is False
+    assert not recognizer.db.student_exists("NOPE")
+    assert recognizer.gallery.rows_for("NOPE") == []